@@ -0,0 +1,98 @@
+import asyncio
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from pool import async_engine_options
+import metrics
+
+#----------------------------------------------------------------------------#
+# Async reads.
+#----------------------------------------------------------------------------#
+
+# With ASYNC_READS on and the app served through asgi.py (uvicorn), the
+# read views (listings, detail pages, search) are async views running on
+# the server's event loop. They query through an async engine (asyncpg)
+# with an AsyncSession per statement, so the statements of a page that do
+# not depend on each other run at the same time, and while they wait on
+# Postgres the loop serves other requests instead of holding a thread.
+# Everything else, the writes included, stays on the sync views and the
+# Flask-SQLAlchemy session, run on ASGI_THREADS threads.
+#
+# The async views build their statements with the same query functions
+# as the sync views and render the same templates. They read the primary,
+# not the replicas. The page data cache is called from the loop, which
+# 'redis' blocks for a round trip; 'null' and 'lru' do not.
+#
+# Needs asyncpg and an ASGI server; under WSGI (wsgi.py, flask run) the
+# setting has no effect and the sync views serve every page.
+
+
+class AsyncReads:
+
+  def __init__(self):
+    self.url = None
+    self.options = {}
+    self.engine = None
+    self.sessions = None
+    self.slots = None
+    # endpoint: async view
+    self.views = {}
+
+  def init_app(self, app, views):
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+      raise ValueError('ASYNC_READS needs Postgres, not ' + url.get_backend_name())
+    self.url = url.set(drivername='postgresql+asyncpg')
+    self.options = async_engine_options(app.config)
+    self.views = views
+
+  def start(self):
+    # asyncpg connections belong to the loop that opened them, the engine
+    # is made on first use from the server's loop
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    self.engine = create_async_engine(self.url, **self.options)
+    # timed and logged like the sync statements; a statement runs in the
+    # context of the view that awaits it, its time counts towards the
+    # request (summed, they overlap)
+    event.listen(self.engine.sync_engine, 'before_cursor_execute', metrics.before_cursor_execute)
+    event.listen(self.engine.sync_engine, 'after_cursor_execute', metrics.after_cursor_execute)
+    # reads only, nothing to expire after a commit
+    self.sessions = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+    # hundreds of views can be waiting on the loop where the sync server
+    # has a thread each for a few dozen. Past the pool's connections they
+    # queue here, in order and without the pool's timeout.
+    if 'pool_size' in self.options:
+      self.slots = asyncio.Semaphore(self.options['pool_size'])
+
+  async def stop(self):
+    # closes the pooled connections, at server shutdown
+    if self.engine is not None:
+      await self.engine.dispose()
+      self.engine = None
+      self.slots = None
+
+  async def fetch(self, statement):
+    # all rows of statement, from a session of its own; an AsyncSession
+    # runs one statement at a time
+    if self.slots is None:
+      return await self.execute(statement)
+    async with self.slots:
+      return await self.execute(statement)
+
+  async def execute(self, statement):
+    async with self.sessions() as session:
+      result = await session.execute(statement)
+      return result.all()
+
+  async def run(self, *statements):
+    # rows of each statement (queries or selects), all run at once
+    if self.engine is None:
+      self.start()
+    return await asyncio.gather(*(
+      self.fetch(getattr(statement, 'statement', statement)) for statement in statements
+    ))
+
+
+reads = AsyncReads()
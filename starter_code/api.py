@@ -0,0 +1,207 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from models import db, Venue, Artist, Show
+from queries import encode_cursor
+from shows import show_filters
+from counters import show_counts
+from search import search
+from browse import browse
+from enums import Genre, State
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Read-only v1 API for the mobile and partner clients. Every endpoint
+# selects plain columns (no ORM entities, no identity map), pages with
+# cursors and takes ?fields=a,b to narrow the columns returned.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+FIELDS = {
+  Venue: (
+    'id', 'name', 'city', 'state', 'address', 'phone', 'genres',
+    'image_link', 'website_link', 'facebook_link', 'seeking_talent',
+    'seeking_description', 'updated_at'
+  ),
+  Artist: (
+    'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+    'facebook_link', 'website_link', 'seeking_venue',
+    'seeking_description', 'updated_at'
+  ),
+}
+
+MAX_LIMIT = 200
+
+
+def dumps(data):
+  if orjson is not None:
+    return orjson.dumps(data)
+  return json.dumps(data, default=lambda value: value.isoformat())
+
+
+def json_response(data):
+  return Response(dumps(data), mimetype='application/json')
+
+
+def limit_arg():
+  return min(max(request.args.get('limit', 50, type=int), 1), MAX_LIMIT)
+
+
+def selected_columns(model):
+  # columns named by ?fields=, all of them by default. id is always
+  # included, cursors are built from it.
+  allowed = FIELDS[model]
+  if not request.args.get('fields'):
+    names = allowed
+  else:
+    names = [name for name in request.args['fields'].split(',') if name]
+    unknown = set(names) - set(allowed)
+    if unknown:
+      abort(400, 'Unknown fields: ' + ', '.join(sorted(unknown)))
+    if 'id' not in names:
+      names = ['id'] + names
+  return [getattr(model, name) for name in names]
+
+
+def entity_list(model):
+  limit = limit_arg()
+  query = db.select(*selected_columns(model)).order_by(model.id).limit(limit + 1)
+  after = request.args.get('after', type=int)
+  if after is not None:
+    query = query.where(model.id > after)
+  rows = [dict(row._mapping) for row in db.session.execute(query)]
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = rows[-1]['id']
+  return json_response({'data': rows, 'next': next_cursor})
+
+
+def entity_detail(model, owner_column, entity_id):
+  query = db.select(*selected_columns(model)).where(model.id == entity_id)
+  row = db.session.execute(query).first()
+  if row is None:
+    abort(404)
+  data = dict(row._mapping)
+  upcoming, past = show_counts(owner_column, entity_id, datetime.now())
+  data['upcoming_shows_count'] = upcoming
+  data['past_shows_count'] = past
+  return json_response({'data': data})
+
+
+def entity_search(model):
+  term = request.args.get('q', '')
+  if not term:
+    abort(400, 'Missing q')
+  page = max(request.args.get('page', 1, type=int), 1)
+  rows, total = search(model, term, page, limit_arg())
+  return json_response({'data': rows, 'total': total, 'page': page})
+
+
+def browse_filters():
+  # ?genre= (repeatable) &match=any|all &state= &city= &seeking=1|0 &upcoming=1
+  genres = request.args.getlist('genre')
+  unknown = set(genres) - {genre.name for genre in Genre}
+  if unknown:
+    abort(400, 'Unknown genres: ' + ', '.join(sorted(unknown)))
+  match = request.args.get('match', 'any')
+  if match not in ('any', 'all'):
+    abort(400, 'match is any or all')
+  state = request.args.get('state')
+  if state and state not in State.__members__:
+    abort(400, 'Unknown state: ' + state)
+  seeking = request.args.get('seeking')
+  if seeking not in (None, '', '0', '1'):
+    abort(400, 'seeking is 0 or 1')
+  return {
+    'genres': genres,
+    'match': match,
+    'state': state or None,
+    'city': request.args.get('city') or None,
+    'seeking': None if not seeking else seeking == '1',
+    'upcoming': request.args.get('upcoming') == '1',
+  }
+
+
+def entity_browse(model):
+  filters = browse_filters()
+  page = max(request.args.get('page', 1, type=int), 1)
+  rows, total, facets = browse(
+    model, filters, datetime.now(), page, limit_arg(),
+    current_app.config['FACETS_CACHE_TTL']
+  )
+  return json_response({'data': rows, 'total': total, 'page': page, 'facets': {'genres': facets}})
+
+
+# by status code, the app's own 404/500 handlers render HTML pages and
+# would take precedence over a handler for all HTTP errors
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(500)
+def error(error):
+  response = json_response({'error': error.description})
+  response.status_code = error.code
+  return response
+
+
+@api.route('/venues')
+def venues():
+  return entity_list(Venue)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+  return entity_detail(Venue, Show.venue_id, venue_id)
+
+
+@api.route('/venues/search')
+def search_venues():
+  return entity_search(Venue)
+
+
+@api.route('/venues/browse')
+def browse_venues():
+  return entity_browse(Venue)
+
+
+@api.route('/artists')
+def artists():
+  return entity_list(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+  return entity_detail(Artist, Show.artist_id, artist_id)
+
+
+@api.route('/artists/search')
+def search_artists():
+  return entity_search(Artist)
+
+
+@api.route('/artists/browse')
+def browse_artists():
+  return entity_browse(Artist)
+
+
+@api.route('/shows')
+def shows():
+  # same filters and cursor as the /shows page; their 400 comes back
+  # as JSON through error()
+  query, _ = show_filters(request.args)
+  limit = limit_arg()
+  rows = [row._asdict() for row in query.limit(limit + 1)]
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]['start_time'], rows[-1]['id'])
+  return json_response({'data': rows, 'next': next_cursor})
@@ -0,0 +1,271 @@
+from datetime import datetime
+
+from flask import (
+    Blueprint,
+    abort,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    url_for
+  )
+
+from forms import ArtistForm
+from models import db, Venue, Artist, Show
+from queries import show_page
+from loading import load
+from search import search
+from cache import cache
+from counters import counts
+from aio import reads
+from jobs import jobs
+from pages import (
+    request_now,
+    show_cursors,
+    page_validators,
+    conditional_response,
+    is_fresh,
+    touch,
+    columns,
+    artist_pages,
+    linked_ids,
+    linked_pages,
+    page_validators_async,
+    entity_data_async,
+    search_async
+  )
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+artists = Blueprint('artists', __name__, url_prefix='/artists')
+
+@artists.route('')
+def index():
+  artists = cache.get_or_set('artists', '', lambda: [
+    {'id': artist.id, 'name': artist.name}
+    for artist in load(Artist, 'list').all()
+  ])
+  return render_template('pages/artists.html', artists=artists)
+
+@artists.route('/search', methods=['POST'])
+def search_artists():
+  # case-insensitive partial match on the artist name, ranked
+  search_term = request.form.get('search_term', '')
+  page = max(request.form.get('page', 1, type=int), 1)
+  if search_term:
+    response, count = search(Artist, search_term, page, current_app.config['SEARCH_PAGE_SIZE'])
+  else:
+    count = ''
+    response = ''
+    flash('Please insert a value to search for artist')
+  return render_template(
+      'pages/search_artists.html',
+      count=count,
+      results=response,
+      search_term=search_term,
+      page=page,
+      page_size=current_app.config['SEARCH_PAGE_SIZE']
+    )
+
+@artists.route('/<int:artist_id>')
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  upcoming_after, past_before = show_cursors()
+  etag, last_modified = page_validators(Artist, Show.artist_id, artist_id)
+  return conditional_response(etag, last_modified, lambda: render_template(
+      'pages/show_artist.html',
+      artist=cache.get_or_set(
+        'artist:%d' % artist_id, etag,
+        lambda: artist_data(artist_id, upcoming_after, past_before)
+      )
+    ))
+
+def artist_data(artist_id, upcoming_after, past_before):
+  artist = load(Artist).get_or_404(artist_id)
+  now = request_now()
+
+  upcoming_shows, upcoming_next = show_page(
+      Show.artist_id, artist_id, Venue, now, True,
+      upcoming_after, current_app.config['SHOWS_PAGE_SIZE']
+    )
+  past_shows, past_next = show_page(
+      Show.artist_id, artist_id, Venue, now, False,
+      past_before, current_app.config['SHOWS_PAGE_SIZE']
+    )
+  return artist_page(columns(artist), counts(artist, now), upcoming_shows, upcoming_next, past_shows, past_next)
+
+def artist_page(data, show_counts, upcoming_shows, upcoming_next, past_shows, past_next):
+  upcoming_count, past_count = show_counts
+  data['past_shows'] = [{
+    'venue_id': show.venue_id,
+    'venue_name': show.venue_name,
+    'venue_image_link': show.venue_image_link,
+    'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
+  } for show in past_shows]
+  data['upcoming_shows'] = [{
+    'venue_id': show.venue_id,
+    'venue_name': show.venue_name,
+    'venue_image_link': show.venue_image_link,
+    'start_time': show.start_time.strftime("%m/%d/%Y, %H:%M")
+  } for show in upcoming_shows]
+  data['past_shows_count'] = past_count
+  data['upcoming_shows_count'] = upcoming_count
+  data['past_next'] = past_next
+  data['upcoming_next'] = upcoming_next
+  return data
+
+#  Update
+#  ----------------------------------------------------------------
+
+@artists.route('/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  form = ArtistForm()
+  artist = load(Artist).get(artist_id)
+
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@artists.route('/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  # TODO: take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  artist = load(Artist).get(artist_id)
+
+
+  error = False
+  try:
+    artist.name = request.form['name']
+    artist.city = request.form['city']
+    artist.state = request.form['state']
+    artist.phone = request.form['phone']
+    artist.genres = request.form.getlist('genres')
+    artist.image_link = request.form['image_link']
+    artist.facebook_link = request.form['facebook_link']
+    artist.website_link = request.form['website_link']
+    artist.seeking_venue = request.form.get('seeking_venue', '')
+    if artist.seeking_venue == '':
+      artist.seeking_venue = False
+    else:
+      artist.seeking_venue = True
+    artist.seeking_description = request.form['seeking_description']
+    db.session.add(artist)
+    # venue pages list the artist's name and image
+    jobs.enqueue('linked_pages', {'table': 'artist', 'id': artist_id})
+    db.session.commit()
+    cache.invalidate(*artist_pages(artist_id))
+  except:
+    error = True
+    current_app.logger.exception('Artist %d could not be edited', artist_id)
+    db.session.rollback()
+  finally:
+    db.session.close()
+  if error:
+    flash('An error occurred. Aritst details could not be edited.')
+  else:
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+#  Delete Artist
+#  ----------------------------------------------------------------
+
+@artists.route('/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  # like delete_venue: hidden at once, purged after the response
+  error = False
+
+  artist = load(Artist).get_or_404(artist_id)
+  pages = artist_pages(artist_id) + linked_pages(Artist, linked_ids(Artist, artist_id))
+  try:
+    artist.deleted_at = datetime.now()
+    # the venues' pages lose the artist's shows, right away
+    touch(Venue, db.select(Show.venue_id).where(Show.artist_id == artist_id))
+    jobs.enqueue('purge', {'table': 'artist', 'id': artist_id}, key='purge:artist:%d' % artist_id)
+    db.session.commit()
+    cache.invalidate(*pages)
+  except:
+    error = True
+    current_app.logger.exception('Artist %d could not be deleted', artist_id)
+    db.session.rollback()
+  finally:
+    db.session.close()
+  if error:
+    abort(500)
+  return '', 204
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@artists.route('/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@artists.route('/create', methods=['POST'])
+def create_artist_submission():
+
+  form = ArtistForm(request.form, meta={'csrf': False})
+
+  if form.validate():
+    try:
+      artist = Artist(
+          name = form.name.data,
+          city = form.city.data,
+          state = form.state.data,
+          phone = form.phone.data,
+          genres = form.genres.data,
+          image_link = form.image_link.data,
+          facebook_link = form.facebook_link.data,
+          website_link = form.website_link.data,
+          seeking_venue = form.seeking_venue.data,
+          seeking_description = form.seeking_description.data
+      )
+
+      db.session.add(artist)
+      db.session.commit()
+      cache.invalidate('artists')
+      flash('Artist, ' + form.name.data + ' was successfully listed!')
+    except ValueError:
+        current_app.logger.exception('Artist could not be created')
+        db.session.rollback()
+    finally:
+        db.session.close()
+  else:
+      message = []
+      for field, err in form.errors.items():
+          message.append(field + ' ' + '|'.join(err))
+      flash('Errors ' + str(message))
+  return render_template('pages/home.html')
+
+#  Async reads
+#  ----------------------------------------------------------------
+
+async def index_async():
+  async def compute():
+    rows, = await reads.run(db.select(Artist.id, Artist.name))
+    return [{'id': row.id, 'name': row.name} for row in rows]
+  artists = await cache.get_or_set_async('artists', '', compute)
+  return render_template('pages/artists.html', artists=artists)
+
+async def search_artists_async():
+  return await search_async(Artist, 'pages/search_artists.html', 'Please insert a value to search for artist')
+
+async def show_artist_async(artist_id):
+  upcoming_after, past_before = show_cursors()
+  etag, last_modified = await page_validators_async(Artist, Show.artist_id, artist_id)
+  artist = None
+  if not is_fresh(etag, last_modified):
+    artist = await cache.get_or_set_async(
+      'artist:%d' % artist_id, etag,
+      lambda: entity_data_async(Artist, Show.artist_id, Venue, artist_id, upcoming_after, past_before, artist_page)
+    )
+  return conditional_response(etag, last_modified, lambda: render_template(
+      'pages/show_artist.html', artist=artist
+    ))
+
+# endpoints served by the async views with ASYNC_READS on
+async_views = {
+  'artists.index': index_async,
+  'artists.search_artists': search_artists_async,
+  'artists.show_artist': show_artist_async,
+}
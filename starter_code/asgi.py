@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import request
+from werkzeug.exceptions import HTTPException
+from werkzeug.urls import url_decode
+
+from app import create_app
+from aio import reads
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#----------------------------------------------------------------------------#
+
+# uvicorn asgi:app
+#
+# Requests for the async views (ASYNC_READS, see aio.py) are handled on
+# the server's event loop, in a request context of their own. The rest
+# go to the WSGI app on a pool of ASGI_THREADS threads; asgiref's own
+# wrapper would run them all on one shared thread. Streamed pages
+# (?stream=1) render while rows are fetched from the sync session, so
+# they stay on the threads too.
+
+
+class ASGIApp:
+
+  def __init__(self, app):
+    self.app = app
+    self.executor = ThreadPoolExecutor(app.config['ASGI_THREADS'], thread_name_prefix='wsgi')
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      await self.lifespan(receive, send)
+    else:
+      await Request(self)(scope, receive, send)
+
+  async def lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        await reads.stop()
+        self.executor.shutdown(wait=False)
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+  def async_view(self, environ):
+    # the async view serving this request, None for the sync app
+    if not self.app.config['ASYNC_READS'] or url_decode(environ['QUERY_STRING']).get('stream'):
+      return None
+    try:
+      endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+      return None
+    return reads.views.get(endpoint)
+
+
+class Request(WsgiToAsgiInstance):
+  # one request; asgiref reads the body and builds the environ
+
+  def __init__(self, server):
+    super().__init__(server.app)
+    self.server = server
+
+  async def run_wsgi_app(self, body):
+    environ = self.build_environ(self.scope, body)
+    view = self.server.async_view(environ)
+    if view is None:
+      run = sync_to_async(
+        WsgiToAsgiInstance.run_wsgi_app.__wrapped__,
+        thread_sensitive=False,
+        executor=self.server.executor
+      )
+      await run(self, body)
+    else:
+      await self.run_async_view(view, environ)
+
+  async def run_async_view(self, view, environ):
+    # Flask.wsgi_app, awaiting the view. The contexts are context
+    # variables, each request's task sees its own.
+    app = self.server.app
+    context = app.request_context(environ)
+    error = None
+    try:
+      try:
+        context.push()
+        try:
+          response = app.preprocess_request()
+          if response is None:
+            if request.routing_exception is not None:
+              raise request.routing_exception
+            response = await view(**request.view_args)
+        except Exception as e:
+          response = app.handle_user_exception(e)
+        response = app.finalize_request(response)
+      except Exception as e:
+        error = e
+        response = app.handle_exception(e)
+      # rendered already, iterating the body does no I/O
+      chunks = list(response(environ, self.start_response))
+      response.close()
+    finally:
+      context.auto_pop(error)
+    await self.send(self.response_start)
+    await self.send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+  async def __call__(self, scope, receive, send):
+    self.send = send
+    await super().__call__(scope, receive, send)
+
+
+app = ASGIApp(create_app(migrations=False))
@@ -0,0 +1,152 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# Per worker, a sorted list of (normalized name, id) for venues and for
+# artists, with an entry for every word of a name so 'club' finds
+# 'Velvet Club'. A lookup is a bisect to the first key starting with the
+# typed prefix and a short scan from there. Writes made through this
+# process's sessions are applied when they commit; rows written by other
+# workers or by 'flask import' show up at the next full rebuild, every
+# AUTOCOMPLETE_REBUILD seconds.
+
+
+def normalize(text):
+  # case and accent insensitive, runs of spaces collapsed
+  text = unicodedata.normalize('NFKD', text or '')
+  text = ''.join(char for char in text if not unicodedata.combining(char))
+  return ' '.join(text.casefold().split())
+
+
+def keys(name):
+  # the name from each word on
+  words = normalize(name).split(' ')
+  return [' '.join(words[start:]) for start in range(len(words)) if words[start]]
+
+
+class PrefixIndex:
+
+  def __init__(self, model):
+    self.model = model
+    self.lock = threading.Lock()
+    self.entries = []
+    self.names = {}
+    # normalized names, for ranking
+    self.normalized = {}
+    self.built_at = None
+
+  def build(self):
+    names = dict(db.session.query(self.model.id, self.model.name))
+    normalized = {id: normalize(name) for id, name in names.items()}
+    entries = sorted((key, id) for id, name in names.items() for key in keys(name))
+    with self.lock:
+      self.names = names
+      self.normalized = normalized
+      self.entries = entries
+      self.built_at = time.monotonic()
+
+  def ensure_built(self, max_age):
+    if self.built_at is None or time.monotonic() - self.built_at > max_age:
+      self.build()
+
+  def remove(self, id):
+    with self.lock:
+      name = self.names.pop(id, None)
+      if name is None:
+        return
+      del self.normalized[id]
+      for key in keys(name):
+        position = bisect_left(self.entries, (key, id))
+        if position < len(self.entries) and self.entries[position] == (key, id):
+          del self.entries[position]
+
+  def add(self, id, name):
+    self.remove(id)
+    with self.lock:
+      self.names[id] = name
+      self.normalized[id] = normalize(name)
+      for key in keys(name):
+        insort(self.entries, (key, id))
+
+  def complete(self, prefix, limit=10):
+    # [{'id', 'name'}] of up to limit names with a word starting with
+    # prefix, names starting with it first
+    prefix = normalize(prefix)
+    if not prefix:
+      return []
+    with self.lock:
+      position = bisect_left(self.entries, (prefix,))
+      found = []
+      seen = set()
+      # a few more than asked, whole-name matches move to the front
+      while position < len(self.entries) and len(found) < limit * 3:
+        key, id = self.entries[position]
+        if not key.startswith(prefix):
+          break
+        if id not in seen:
+          seen.add(id)
+          found.append((not self.normalized[id].startswith(prefix), self.normalized[id], id, self.names[id]))
+        position += 1
+    found.sort()
+    return [{'id': id, 'name': name} for _, _, id, name in found[:limit]]
+
+
+indexes = {
+  Venue: PrefixIndex(Venue),
+  Artist: PrefixIndex(Artist),
+}
+
+
+#  Incremental updates
+#  ----------------------------------------------------------------
+
+# changes are noted on the session when they are flushed and applied once
+# it commits, a rolled back name never reaches the index
+
+def note(operation):
+  def listener(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+      # a soft delete takes the name out too
+      change = 'delete' if target.deleted_at is not None else operation
+      session.info.setdefault('autocomplete', []).append((change, type(target), target.id, target.name))
+  return listener
+
+
+def apply_changes(session):
+  for operation, model, id, name in session.info.pop('autocomplete', []):
+    index = indexes[model]
+    if index.built_at is None:
+      continue
+    if operation == 'delete':
+      index.remove(id)
+    else:
+      index.add(id, name)
+
+
+def discard_changes(session, *args):
+  session.info.pop('autocomplete', None)
+
+
+for model in indexes:
+  event.listen(model, 'after_insert', note('insert'))
+  event.listen(model, 'after_update', note('update'))
+  event.listen(model, 'after_delete', note('delete'))
+event.listen(Session, 'after_commit', apply_changes)
+event.listen(Session, 'after_rollback', discard_changes)
+
+
+def complete(model, prefix, limit=10, max_age=300):
+  index = indexes[model]
+  index.ensure_built(max_age)
+  return index.complete(prefix, limit)
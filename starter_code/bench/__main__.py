@@ -0,0 +1,384 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import click
+
+#----------------------------------------------------------------------------#
+# Benchmark commands.
+#----------------------------------------------------------------------------#
+
+# python -m bench seed --scale large --database postgresql://...
+# python -m bench run --output results.json
+# python -m bench compare baseline.json results.json
+# python -m bench autocomplete
+# python -m bench search --rows 1000000 --database postgresql://...
+# python -m bench datetime
+# python -m bench run --url http://127.0.0.1:8000 --clients 500 --async-only ...
+# python -m bench startup
+#
+# The database defaults to DATABASE_URL, like the app. Point it at a
+# scratch database, seeding empties the tables.
+
+
+def load_app(database):
+  # config.py reads the environment when create_app imports it
+  if database:
+    os.environ['DATABASE_URL'] = database
+  if os.environ.get('DATABASE_URL', '').startswith('sqlite'):
+    use_sqlite_arrays()
+  from app import create_app
+  app = create_app(migrations=False)
+  # the write scenarios post the forms without a CSRF token
+  app.config['WTF_CSRF_ENABLED'] = False
+  # one INFO line per request would drown the report, slow queries
+  # and errors still come through
+  app.logger.setLevel(logging.WARNING)
+  return app
+
+
+def use_sqlite_arrays():
+  # genres are a Postgres ARRAY. On SQLite they are stored as JSON text,
+  # enough for the pages to render; use Postgres for numbers that matter.
+  import sqlite3
+  from sqlalchemy import ARRAY
+  from sqlalchemy.ext.compiler import compiles
+
+  sqlite3.register_adapter(list, json.dumps)
+
+  @compiles(ARRAY, 'sqlite')
+  def compile_array(type_, compiler, **kw):
+    return 'TEXT'
+
+  result_processor = ARRAY.result_processor
+
+  def decode_array(self, dialect, coltype):
+    if dialect.name == 'sqlite':
+      return lambda value: None if value is None else json.loads(value)
+    return result_processor(self, dialect, coltype)
+
+  ARRAY.result_processor = decode_array
+
+
+def revision():
+  try:
+    return subprocess.check_output(
+      ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+    ).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+@click.group()
+def cli():
+  """Seed a synthetic dataset and benchmark every Fyyur route."""
+
+
+@cli.command()
+@click.option('--database', help='Database URL, defaults to DATABASE_URL.')
+@click.option('--scale', type=click.Choice(['small', 'medium', 'large']), default='small', show_default=True)
+@click.option('--venues', type=int, help='Overrides the scale.')
+@click.option('--artists', type=int, help='Overrides the scale.')
+@click.option('--shows', type=int, help='Overrides the scale.')
+@click.option('--seed', 'random_seed', default=0, show_default=True)
+def seed(database, scale, venues, artists, shows, random_seed):
+  """Replace the catalogue with a synthetic one."""
+  from bench.seed import SCALES, seed as seed_dataset
+  app = load_app(database)
+  size = dict(SCALES[scale])
+  for name, value in (('venues', venues), ('artists', artists), ('shows', shows)):
+    if value is not None:
+      size[name] = value
+  with app.app_context():
+    seed_dataset(size['venues'], size['artists'], size['shows'], random_seed, report=click.echo)
+  click.echo('seeded %(venues)d venues, %(artists)d artists, %(shows)d shows' % size)
+
+
+@cli.command()
+@click.option('--database', help='Database URL, defaults to DATABASE_URL.')
+@click.option('--url', help='Benchmark a running server instead of the app in process.')
+@click.option('--clients', default=8, show_default=True, help='Concurrent clients.')
+@click.option('--requests', 'requests_per_route', default=100, show_default=True, help='Requests per route.')
+@click.option('--writes', is_flag=True, help='Also create, edit and delete rows.')
+@click.option('--only', multiple=True, help='Scenario to run, repeatable.')
+@click.option('--async-only', is_flag=True, help='Only the scenarios of the views ASYNC_READS replaces.')
+@click.option('--output', type=click.Path(dir_okay=False), default='bench-results.json', show_default=True)
+def run(database, url, clients, requests_per_route, writes, only, async_only, output):
+  """Drive every route with concurrent clients and record the latencies."""
+  from bench.runner import Dataset, TestClient, HTTPClient, ASYNC_SCENARIOS, run as run_scenarios, delete_venues
+  from models import db, Venue, Artist, Show
+
+  if async_only:
+    only = set(only) | ASYNC_SCENARIOS
+  app = load_app(database)
+  with app.app_context():
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    show_count = db.session.query(Show).count()
+    dialect = db.engine.dialect.name
+  if not venue_ids or not artist_ids:
+    raise click.ClickException('No venues or artists, run "python -m bench seed" first.')
+  data = Dataset(venue_ids, artist_ids, dialect)
+
+  if url:
+    make_client = lambda: HTTPClient(url)
+  else:
+    make_client = lambda: TestClient(app)
+
+  def report(name, result):
+    click.echo('%-20s p50 %8.1f ms  p95 %8.1f ms  p99 %8.1f ms  %7.1f req/s  %s queries  %d errors' % (
+      name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+      result['throughput_rps'],
+      '%5.1f' % result['queries_mean'] if result['queries_mean'] is not None else '    -',
+      result['errors']
+    ))
+
+  started_at = datetime.now()
+  routes = run_scenarios(make_client, data, requests_per_route, clients, writes, set(only), report)
+  if writes and (not only or 'venue_delete' in only):
+    with app.app_context():
+      created = [id for id, in db.session.query(Venue.id).filter(Venue.id > venue_ids[-1])]
+    if created:
+      routes['venue_delete'] = delete_venues(make_client, created, clients)
+      report('venue_delete', routes['venue_delete'])
+
+  results = {
+    'meta': {
+      'started_at': started_at.isoformat(timespec='seconds'),
+      'revision': revision(),
+      'database': dialect,
+      'target': url or 'in-process',
+      'python': sys.version.split()[0],
+      'clients': clients,
+      'requests_per_route': requests_per_route,
+      'dataset': {'venues': len(venue_ids), 'artists': len(artist_ids), 'shows': show_count},
+    },
+    'routes': routes,
+  }
+  with open(output, 'w') as stream:
+    json.dump(results, stream, indent=2, sort_keys=True)
+  click.echo('results written to %s' % output)
+
+
+@cli.command()
+@click.option('--database', help='Database URL, defaults to DATABASE_URL.')
+@click.option('--lookups', default=1000, show_default=True, help='Lookups per prefix length.')
+def autocomplete(database, lookups):
+  """Time /autocomplete's prefix index against search() (ILIKE on Postgres)."""
+  import random
+  import time
+  from autocomplete import indexes
+  from search import search
+  from bench.seed import WORDS
+  from models import Venue, Artist
+
+  app = load_app(database)
+  with app.app_context():
+    for model in (Venue, Artist):
+      index = indexes[model]
+      start = time.perf_counter()
+      index.build()
+      click.echo('%s: %d names, %d keys, built in %.0f ms' % (
+        model.__tablename__, len(index.names), len(index.entries),
+        (time.perf_counter() - start) * 1000
+      ))
+      terms = [random.choice(WORDS).lower() for _ in range(lookups)]
+      for length in (1, 3, 6):
+        for name, lookup in (
+          ('prefix index', lambda term: index.complete(term, 10)),
+          ('search()', lambda term: search(model, term, 1, 10)),
+        ):
+          # search() is much slower, fewer of them
+          count = lookups if name == 'prefix index' else max(lookups // 20, 1)
+          start = time.perf_counter()
+          for term in terms[:count]:
+            lookup(term[:length])
+          elapsed = (time.perf_counter() - start) / count
+          click.echo('  %-13s %d chars  %8.3f ms per lookup' % (name, length, elapsed * 1000))
+
+
+@cli.command('search')
+@click.option('--database', help='Database URL, defaults to DATABASE_URL.')
+@click.option('--rows', default=100000, show_default=True, help='Venues to seed, the tables are emptied first.')
+@click.option('--queries', default=50, show_default=True, help='Searches per kind of term.')
+@click.option('--seed', 'random_seed', default=0, show_default=True)
+def search_latency(database, rows, queries, random_seed):
+  """Time venue search, the ILIKE scans it was against the trigram index (Postgres)."""
+  import random
+  import time
+  from sqlalchemy import text
+  from bench.runner import percentile
+  from bench.seed import WORDS, Generator, insert, seed as seed_dataset
+  from counters import check
+  from metrics import slow_queries
+  from models import db, Venue
+  from search import search
+
+  def before(term):
+    # search_venues as it was in app.py: every match loaded, counted
+    # again, sequential scans as there was no index to use
+    db.session.execute(text('SET LOCAL enable_bitmapscan = off'))
+    matches = Venue.query.filter(Venue.name.ilike('%' + term + '%'))
+    matches.all()
+    matches.count()
+
+  def after(term):
+    search(Venue, term, 1, app.config['SEARCH_PAGE_SIZE'])
+
+  app = load_app(database)
+  # the unindexed scans are all slow queries, the report says how slow
+  slow_queries.setLevel(logging.ERROR)
+  with app.app_context():
+    if db.engine.dialect.name != 'postgresql':
+      raise click.ClickException('The trigram index is Postgres only, pass a postgresql:// --database.')
+    started = time.perf_counter()
+    seed_dataset(0, 0, 0, random_seed)
+    # a chunk at a time, a million rows as dicts would take gigabytes
+    generator = Generator(random_seed)
+    chunk_size = 5000
+    for start in range(1, rows + 1, chunk_size):
+      numbers = range(start, min(start + chunk_size, rows + 1))
+      insert(Venue, [generator.venue(number) for number in numbers], chunk_size)
+    check(datetime.now(), repair=True)
+    db.session.execute(text('ANALYZE venue'))
+    db.session.commit()
+    click.echo('seeded %d venues in %.0f s' % (rows, time.perf_counter() - started))
+
+    rng = random.Random(random_seed)
+    kinds = (
+      # about one name in ten
+      ('word', lambda: rng.choice(WORDS).lower()),
+      # one in four hundred
+      ('two words', lambda: '%s %s' % (rng.choice(WORDS).lower(), rng.choice(WORDS).lower())),
+      # a handful, the numbers are unique
+      ('number', lambda: str(rng.randint(1, rows))),
+    )
+    for kind, draw in kinds:
+      terms = [draw() for _ in range(queries)]
+      for name, lookup in (('LIKE', before), ('trigram', after)):
+        times = []
+        for term in terms:
+          start = time.perf_counter()
+          lookup(term)
+          times.append((time.perf_counter() - start) * 1000)
+          # ends the SET LOCAL, drops the loaded venues
+          db.session.remove()
+        times.sort()
+        click.echo('%-10s %-8s p50 %9.1f ms  p95 %9.1f ms' % (
+          kind, name, percentile(times, 0.5), percentile(times, 0.95)
+        ))
+
+
+@cli.command('datetime')
+@click.option('--values', 'count', default=100000, show_default=True, help='Datetimes formatted per run.')
+@click.option('--distinct', default=2000, show_default=True, help='Different datetimes among them, as on /shows.')
+def datetime_filter(count, distinct):
+  """Time the datetime filter against babel.dates.format_datetime per call."""
+  import random
+  import time
+  from datetime import timedelta
+  from babel.dates import format_datetime as babel_format
+  from filters import PATTERNS, compiled, format_datetime
+
+  def before(value, format='medium'):
+    # the filter as it was in app.py
+    return babel_format(value, PATTERNS[format], locale='en')
+
+  start = datetime(2030, 1, 1)
+  rng = random.Random(0)
+  times = [start + timedelta(minutes=rng.randrange(525600)) for _ in range(distinct)]
+  values = [rng.choice(times) for _ in range(count)]
+  for format in ('medium', 'full'):
+    assert before(values[0], format) == format_datetime(values[0], format)
+    for name, formatter in (
+      ('babel per call', before),
+      ('precompiled', format_datetime.__wrapped__),
+      ('precompiled + LRU', format_datetime),
+    ):
+      compiled.cache_clear()
+      format_datetime.cache_clear()
+      started = time.perf_counter()
+      for value in values:
+        formatter(value, format)
+      elapsed = time.perf_counter() - started
+      click.echo('%-7s %-18s %8.0f ms  %6.2f us per value' % (
+        format, name, elapsed * 1000, elapsed / count * 1e6
+      ))
+
+
+# wsgi builds its app on import, the other entry points through create_app()
+STARTUP = 'import %s as module\nif not hasattr(module, "app"): module.create_app()'
+
+
+@cli.command()
+@click.option('--module', 'modules', multiple=True, default=['wsgi', 'app'], show_default=True,
+  help='Entry point to import, repeatable.')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters per module, the fastest is kept.')
+@click.option('--top', default=15, show_default=True, help='Slowest top-level packages to list.')
+def startup(modules, runs, top):
+  """Time importing an entry point and building the app, with -X importtime."""
+  for module in modules:
+    best = None
+    for _ in range(runs):
+      stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP % module],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+      ).stderr.decode()
+      packages, total = import_times(stderr)
+      if best is None or total < best[1]:
+        best = packages, total
+    packages, total = best
+    click.echo('%s: %.0f ms importing, best of %d' % (module, total / 1000, runs))
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+      click.echo('  %-28s %8.1f ms' % (name, self_us / 1000))
+
+
+def import_times(stderr):
+  # "import time: self [us] | cumulative | imported package" lines, the
+  # self times summed per top-level package
+  packages = {}
+  total = 0
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    self_us, _, name = line[len('import time:'):].split('|')
+    name = name.strip().split('.')[0]
+    packages[name] = packages.get(name, 0) + int(self_us)
+    total += int(self_us)
+  return packages, total
+
+
+@cli.command()
+@click.argument('baseline', type=click.File('r'))
+@click.argument('current', type=click.File('r'))
+@click.option('--threshold', default=0.2, show_default=True, help='Allowed p95 slowdown, as a fraction.')
+def compare(baseline, current, threshold):
+  """Diff two result files, exits 1 when a route's p95 regressed."""
+  before = json.load(baseline)['routes']
+  after = json.load(current)['routes']
+  regressed = []
+  for name in sorted(set(before) & set(after)):
+    old, new = before[name], after[name]
+    change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0.0
+    queries = ''
+    if old['queries_mean'] is not None and new['queries_mean'] is not None \
+        and new['queries_mean'] != old['queries_mean']:
+      queries = '  queries %.1f -> %.1f' % (old['queries_mean'], new['queries_mean'])
+    flag = ''
+    if change > threshold:
+      flag = '  REGRESSED'
+      regressed.append(name)
+    click.echo('%-20s p95 %8.1f -> %8.1f ms  %+6.1f%%%s%s' % (
+      name, old['p95_ms'], new['p95_ms'], change * 100, queries, flag
+    ))
+  for name in sorted(set(before) ^ set(after)):
+    click.echo('%-20s only in %s' % (name, 'baseline' if name in before else 'current'))
+  if regressed:
+    raise click.ClickException('%d routes regressed: %s' % (len(regressed), ', '.join(regressed)))
+
+
+if __name__ == '__main__':
+  cli()
@@ -0,0 +1,263 @@
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+from enums import Genre, State
+from bench.seed import CITIES, WORDS
+
+#----------------------------------------------------------------------------#
+# Load runner.
+#----------------------------------------------------------------------------#
+
+# Every scenario is one route with its arguments drawn at random from the
+# seeded dataset. A scenario is requested a fixed number of times by
+# concurrent clients, either in process through the Flask test client or
+# over HTTP against a running server. Query counts and database time are
+# read from the Server-Timing header, so they work in both modes. Streamed
+# responses (exports, ?stream=1) query after the headers are sent and
+# report none.
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Dataset:
+  # ids and words the scenarios pick their arguments from
+
+  def __init__(self, venue_ids, artist_ids, dialect):
+    self.venue_ids = venue_ids
+    self.artist_ids = artist_ids
+    self.dialect = dialect
+    self.random = random.Random(0)
+    self.lock = threading.Lock()
+
+  def venue(self):
+    with self.lock:
+      return self.random.choice(self.venue_ids)
+
+  def artist(self):
+    with self.lock:
+      return self.random.choice(self.artist_ids)
+
+  def word(self):
+    with self.lock:
+      return self.random.choice(WORDS).lower()
+
+  def city(self):
+    with self.lock:
+      return self.random.choice(CITIES)[0]
+
+  def genre(self):
+    with self.lock:
+      return self.random.choice(list(Genre)).name
+
+
+def venue_form(data, number):
+  return {
+    'name': 'Bench Venue %d' % number, 'city': data.city(), 'state': State.NY.name,
+    'address': '1 Bench St', 'phone': '555-555-5555', 'genres': [data.genre()],
+    'image_link': '', 'facebook_link': 'https://www.facebook.com/bench',
+    'website_link': '', 'seeking_description': '',
+  }
+
+
+def artist_form(data, number):
+  return {
+    'name': 'Bench Artist %d' % number, 'city': data.city(), 'state': State.NY.name,
+    'phone': '555-555-5555', 'genres': [data.genre()], 'image_link': '',
+    'facebook_link': 'https://www.facebook.com/bench', 'website_link': '',
+    'seeking_description': '',
+  }
+
+
+def show_form(data, number):
+  start = datetime.now() + timedelta(days=30, minutes=number)
+  return {
+    'venue_id': str(data.venue()), 'artist_id': str(data.artist()),
+    'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+  }
+
+
+def recent():
+  return (datetime.now() - timedelta(hours=1)).isoformat(timespec='seconds')
+
+
+# (name, method, path(data, number), form(data, number) or None). The
+# read scenarios leave the dataset as it was.
+READS = (
+  ('home', 'GET', lambda data, n: '/', None),
+  ('venues', 'GET', lambda data, n: '/venues', None),
+  ('venue', 'GET', lambda data, n: '/venues/%d' % data.venue(), None),
+  ('venue_edit_form', 'GET', lambda data, n: '/venues/%d/edit' % data.venue(), None),
+  ('venue_create_form', 'GET', lambda data, n: '/venues/create', None),
+  ('venues_search', 'POST', lambda data, n: '/venues/search', lambda data, n: {'search_term': data.word()}),
+  ('artists', 'GET', lambda data, n: '/artists', None),
+  ('artist', 'GET', lambda data, n: '/artists/%d' % data.artist(), None),
+  ('artist_edit_form', 'GET', lambda data, n: '/artists/%d/edit' % data.artist(), None),
+  ('artist_create_form', 'GET', lambda data, n: '/artists/create', None),
+  ('artists_search', 'POST', lambda data, n: '/artists/search', lambda data, n: {'search_term': data.word()}),
+  ('shows', 'GET', lambda data, n: '/shows', None),
+  ('shows_by_city', 'GET', lambda data, n: '/shows?city=' + urllib.parse.quote(data.city()), None),
+  ('shows_by_genre', 'GET', lambda data, n: '/shows?genre=' + data.genre(), None),
+  ('shows_streamed', 'GET', lambda data, n: '/shows?stream=1', None),
+  ('show_create_form', 'GET', lambda data, n: '/shows/create', None),
+  ('export_venues', 'GET', lambda data, n: '/export/venues?since=' + recent(), None),
+  ('export_artists', 'GET', lambda data, n: '/export/artists?since=' + recent(), None),
+  ('export_shows', 'GET', lambda data, n: '/export/shows?since=' + recent(), None),
+  ('cache_stats', 'GET', lambda data, n: '/cache/stats', None),
+  ('pool_stats', 'GET', lambda data, n: '/pool/stats', None),
+  ('metrics', 'GET', lambda data, n: '/metrics', None),
+  ('api_venues', 'GET', lambda data, n: '/api/v1/venues', None),
+  ('api_venue', 'GET', lambda data, n: '/api/v1/venues/%d' % data.venue(), None),
+  ('api_venues_search', 'GET', lambda data, n: '/api/v1/venues/search?q=' + data.word(), None),
+  ('api_artists', 'GET', lambda data, n: '/api/v1/artists', None),
+  ('api_artist', 'GET', lambda data, n: '/api/v1/artists/%d' % data.artist(), None),
+  ('api_artists_search', 'GET', lambda data, n: '/api/v1/artists/search?q=' + data.word(), None),
+  ('api_shows', 'GET', lambda data, n: '/api/v1/shows', None),
+  ('autocomplete', 'GET', lambda data, n: '/autocomplete?q=' + data.word()[:3], None),
+  ('api_venues_browse', 'GET', lambda data, n: '/api/v1/venues/browse?upcoming=1&genre=' + data.genre(), None),
+  ('api_artists_browse', 'GET', lambda data, n: '/api/v1/artists/browse?seeking=1&city=' + urllib.parse.quote(data.city()), None),
+)
+
+# the write scenarios add rows and edit existing ones, venues created
+# here are the ones delete_venue removes afterwards
+WRITES = (
+  ('venue_create', 'POST', lambda data, n: '/venues/create', venue_form),
+  ('venue_edit', 'POST', lambda data, n: '/venues/%d/edit' % data.venue(), venue_form),
+  ('artist_create', 'POST', lambda data, n: '/artists/create', artist_form),
+  ('artist_edit', 'POST', lambda data, n: '/artists/%d/edit' % data.artist(), artist_form),
+  ('show_create', 'POST', lambda data, n: '/shows/create', show_form),
+)
+
+# genres are a Postgres ARRAY, containment is not available elsewhere
+POSTGRESQL_ONLY = {'shows_by_genre'}
+
+# the routes served by async views with ASYNC_READS on (see aio.py),
+# which only takes effect behind the ASGI server: run them with --url
+ASYNC_SCENARIOS = {
+  'venues', 'venue', 'venues_search', 'artists', 'artist', 'artists_search',
+  'shows', 'shows_by_city', 'shows_by_genre',
+}
+
+
+class TestClient:
+  # in process, through the app's WSGI stack
+
+  def __init__(self, app):
+    self.client = app.test_client()
+
+  def request(self, method, path, form=None):
+    response = self.client.open(path, method=method, data=form)
+    # reads streamed bodies to the end
+    response.get_data()
+    return response.status_code, response.headers.get('Server-Timing', '')
+
+
+class HTTPClient:
+
+  def __init__(self, base_url):
+    self.base_url = base_url.rstrip('/')
+
+  def request(self, method, path, form=None):
+    body = urllib.parse.urlencode(form, doseq=True).encode() if form is not None else None
+    request = urllib.request.Request(self.base_url + path, data=body, method=method)
+    try:
+      with urllib.request.urlopen(request) as response:
+        response.read()
+        return response.status, response.headers.get('Server-Timing', '')
+    except urllib.error.HTTPError as error:
+      return error.code, error.headers.get('Server-Timing', '')
+
+
+def percentile(values, fraction):
+  # nearest rank on sorted values
+  if not values:
+    return None
+  return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_scenario(make_client, data, scenario, requests, clients):
+  name, method, path, form = scenario
+  latencies = []
+  queries = []
+  db_ms = []
+  errors = []
+  lock = threading.Lock()
+  counter = iter(range(requests))
+
+  def work():
+    client = make_client()
+    while True:
+      with lock:
+        number = next(counter, None)
+      if number is None:
+        return
+      target = path(data, number)
+      body = form(data, number) if form else None
+      start = time.perf_counter()
+      try:
+        status, timing = client.request(method, target, body)
+      except Exception as error:
+        status, timing = None, ''
+        with lock:
+          errors.append('%s: %s' % (target, error))
+      elapsed = (time.perf_counter() - start) * 1000
+      match = SERVER_TIMING_DB.search(timing)
+      with lock:
+        latencies.append(elapsed)
+        if status is not None and status >= 400:
+          errors.append('%s: %d' % (target, status))
+        if match:
+          db_ms.append(float(match.group(1)))
+          queries.append(int(match.group(2)))
+
+  started = time.perf_counter()
+  threads = [threading.Thread(target=work) for _ in range(clients)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  wall = time.perf_counter() - started
+
+  latencies.sort()
+  return {
+    'method': method,
+    'requests': len(latencies),
+    'errors': len(errors),
+    'error_samples': errors[:5],
+    'p50_ms': percentile(latencies, 0.50),
+    'p95_ms': percentile(latencies, 0.95),
+    'p99_ms': percentile(latencies, 0.99),
+    'max_ms': latencies[-1] if latencies else None,
+    'throughput_rps': len(latencies) / wall if wall else None,
+    'queries_mean': sum(queries) / len(queries) if queries else None,
+    'queries_max': max(queries) if queries else None,
+    'db_ms_mean': sum(db_ms) / len(db_ms) if db_ms else None,
+  }
+
+
+def run(make_client, data, requests, clients, writes=False, only=None, report=None):
+  # {scenario name: results}, reads first so writes do not change what
+  # they measure
+  scenarios = list(READS) + (list(WRITES) if writes else [])
+  results = {}
+  for scenario in scenarios:
+    name = scenario[0]
+    if only and name not in only:
+      continue
+    if name in POSTGRESQL_ONLY and data.dialect != 'postgresql':
+      continue
+    results[name] = run_scenario(make_client, data, scenario, requests, clients)
+    if report:
+      report(name, results[name])
+  return results
+
+
+def delete_venues(make_client, venue_ids, clients):
+  # DELETE /venues/<id> for the venues the write scenarios created
+  scenario = ('venue_delete', 'DELETE', lambda data, n: '/venues/%d' % venue_ids[n], None)
+  return run_scenario(make_client, None, scenario, len(venue_ids), clients)
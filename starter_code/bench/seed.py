@@ -0,0 +1,185 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from enums import Genre
+from models import db, Venue, Artist, Show
+from counters import check
+
+#----------------------------------------------------------------------------#
+# Synthetic dataset.
+#----------------------------------------------------------------------------#
+
+# Rows are drawn from a seeded generator, so the same scale and seed give
+# the same dataset. A few cities and genres account for most rows, as in
+# the real catalogue, and shows spread over the year around now with a
+# few headline venues and artists getting many more than the rest, as
+# far as their free evening slots allow.
+
+SCALES = {
+  'small': {'venues': 100, 'artists': 200, 'shows': 2000},
+  'medium': {'venues': 1000, 'artists': 2000, 'shows': 50000},
+  'large': {'venues': 10000, 'artists': 20000, 'shows': 500000},
+}
+
+CITIES = (
+  ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+  ('Austin', 'TX'), ('Nashville', 'TN'), ('San Francisco', 'CA'),
+  ('Seattle', 'WA'), ('New Orleans', 'LA'), ('Atlanta', 'GA'),
+  ('Denver', 'CO'), ('Portland', 'OR'), ('Detroit', 'MI'),
+  ('Boston', 'MA'), ('Philadelphia', 'PA'), ('Miami', 'FL'),
+  ('Minneapolis', 'MN'), ('Kansas City', 'MO'), ('Memphis', 'TN'),
+  ('Phoenix', 'AZ'), ('Columbus', 'OH'),
+)
+
+GENRES = [genre.name for genre in Genre]
+
+WORDS = (
+  'Blue', 'Red', 'Velvet', 'Electric', 'Golden', 'Silver', 'Midnight',
+  'Lucky', 'Wild', 'Broken', 'Northern', 'Little', 'Grand', 'Crystal',
+  'Iron', 'Paper', 'Rusty', 'Neon', 'Hidden', 'Howling',
+)
+
+# evening slots from 240 days ago to 120 days ahead
+SLOTS = 361 * 3
+
+VENUE_NOUNS = ('Room', 'Hall', 'Tavern', 'Lounge', 'Theatre', 'Club', 'Garden', 'Cellar')
+ARTIST_NOUNS = ('Band', 'Trio', 'Collective', 'Orchestra', 'Brothers', 'Project', 'Kids')
+
+
+def zipf_weights(n, s=1.1):
+  # cumulative weights, item k is drawn with probability ~ 1/k^s
+  return list(accumulate(1 / (k ** s) for k in range(1, n + 1)))
+
+
+class Generator:
+
+  def __init__(self, seed):
+    self.random = random.Random(seed)
+    self.city_weights = zipf_weights(len(CITIES))
+    self.genre_weights = zipf_weights(len(GENRES))
+
+  def city(self):
+    return self.random.choices(CITIES, cum_weights=self.city_weights)[0]
+
+  def genres(self):
+    count = self.random.choice((1, 1, 2, 2, 3))
+    return sorted(set(self.random.choices(GENRES, cum_weights=self.genre_weights, k=count)))
+
+  def name(self, nouns, number):
+    # numbered so names stay unique, the words give search something
+    # to match
+    return '%s %s %s %d' % (
+      self.random.choice(WORDS), self.random.choice(WORDS),
+      self.random.choice(nouns), number
+    )
+
+  def phone(self):
+    return '%03d-%03d-%04d' % (
+      self.random.randint(200, 999), self.random.randint(200, 999),
+      self.random.randint(0, 9999)
+    )
+
+  def venue(self, number):
+    city, state = self.city()
+    seeking = self.random.random() < 0.3
+    return {
+      'name': self.name(VENUE_NOUNS, number),
+      'city': city,
+      'state': state,
+      'address': '%d %s St' % (self.random.randint(1, 9999), self.random.choice(WORDS)),
+      'phone': self.phone(),
+      'genres': self.genres(),
+      'image_link': 'https://images.example.com/venues/%d.jpg' % number,
+      'website_link': 'https://venue%d.example.com' % number,
+      'facebook_link': 'https://www.facebook.com/venue%d' % number,
+      'seeking_talent': seeking,
+      'seeking_description': 'Looking for local acts' if seeking else None,
+    }
+
+  def artist(self, number):
+    city, state = self.city()
+    seeking = self.random.random() < 0.4
+    return {
+      'name': self.name(ARTIST_NOUNS, number),
+      'city': city,
+      'state': state,
+      'phone': self.phone(),
+      'genres': self.genres(),
+      'image_link': 'https://images.example.com/artists/%d.jpg' % number,
+      'website_link': 'https://artist%d.example.com' % number,
+      'facebook_link': 'https://www.facebook.com/artist%d' % number,
+      'seeking_venue': seeking,
+      'seeking_description': 'Touring next season' if seeking else None,
+    }
+
+  def show(self, venue_ids, artist_ids, venue_weights, artist_weights, today, booked):
+    # a show in a free slot of its venue and artist, or None when the
+    # draws keep hitting booked ones (headline venues fill up)
+    for _ in range(20):
+      venue_id = self.random.choices(venue_ids, cum_weights=venue_weights)[0]
+      artist_id = self.random.choices(artist_ids, cum_weights=artist_weights)[0]
+      # two thirds in the past, like a catalogue that has been running;
+      # three two-hour slots an evening, numbered 0 to SLOTS - 1
+      slot = self.random.randrange(SLOTS)
+      start_time = today + timedelta(days=slot // 3 - 240, hours=18 + 2 * (slot % 3))
+      # one int per venue or artist and slot keeps the set small
+      venue_slot = venue_id * SLOTS + slot
+      artist_slot = -(artist_id * SLOTS + slot) - 1
+      if venue_slot in booked or artist_slot in booked:
+        continue
+      booked.add(venue_slot)
+      booked.add(artist_slot)
+      return {
+        'venue_id': venue_id,
+        'artist_id': artist_id,
+        'start_time': start_time,
+        'end_time': start_time + timedelta(hours=2),
+      }
+    return None
+
+
+def insert(model, rows, chunk_size):
+  for start in range(0, len(rows), chunk_size):
+    db.session.execute(model.__table__.insert(), rows[start:start + chunk_size])
+    db.session.commit()
+
+
+def seed(venues, artists, shows, seed=0, chunk_size=5000, report=None):
+  # empties the tables and loads a fresh dataset of the given size. Needs
+  # an app context.
+  generator = Generator(seed)
+  today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+  db.create_all()
+  for model in (Show, Venue, Artist):
+    db.session.query(model).delete()
+  db.session.commit()
+
+  insert(Venue, [generator.venue(number) for number in range(1, venues + 1)], chunk_size)
+  insert(Artist, [generator.artist(number) for number in range(1, artists + 1)], chunk_size)
+  venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+  artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+  if report:
+    report('%d venues, %d artists' % (len(venue_ids), len(artist_ids)))
+
+  # shows are generated and inserted a chunk at a time, at the large
+  # scale a list of all of them would take hundreds of megabytes
+  venue_weights = zipf_weights(len(venue_ids), 0.8)
+  artist_weights = zipf_weights(len(artist_ids), 0.8)
+  # slots taken so far, a venue or artist plays one show at a time
+  booked = set()
+  inserted = 0
+  for start in range(0, shows, chunk_size):
+    rows = [
+      generator.show(venue_ids, artist_ids, venue_weights, artist_weights, today, booked)
+      for _ in range(min(chunk_size, shows - start))
+    ]
+    rows = [row for row in rows if row is not None]
+    db.session.execute(Show.__table__.insert(), rows)
+    db.session.commit()
+    inserted += len(rows)
+    if report:
+      report('%d shows' % inserted)
+
+  # the bulk inserts bypass the counters, recount everything once
+  check(datetime.now(), repair=True)
@@ -0,0 +1,118 @@
+from collections import Counter
+
+from enums import Genre
+from models import db, Venue, Artist
+from counters import has_upcoming, upcoming_count
+from cache import LRUBackend
+
+#----------------------------------------------------------------------------#
+# Browse.
+#----------------------------------------------------------------------------#
+
+# Venues and artists filtered by genre, state, city, seeking flag and
+# upcoming shows, with a count per genre. On Postgres the genre filter is
+# an array overlap (any of the genres) or containment (all of them),
+# served by the GIN indexes on genres, and the counts of all genres come
+# from one GROUP BY over the unnested genres of the matching rows. The
+# counts leave the genre filter out, so they tell what picking another
+# genre would give. They are cached for FACETS_CACHE_TTL seconds in each
+# process, apart from the page data cache: it is off by default
+# (CACHE_BACKEND 'null'), the counts are the costly part of a browse
+# page, and only the TTL expires them, writes do not.
+
+SEEKING = {
+  Venue: Venue.seeking_talent,
+  Artist: Artist.seeking_venue,
+}
+
+# variants of the genre counts kept per process
+FACETS_MAX_ENTRIES = 256
+
+facets_cache = LRUBackend(FACETS_MAX_ENTRIES)
+
+
+def conditions(model, filters, now):
+  # SQL conditions for every filter but the genres
+  found = []
+  if filters['state']:
+    found.append(model.state == filters['state'])
+  if filters['city']:
+    found.append(model.city == filters['city'])
+  if filters['seeking'] is not None:
+    found.append(SEEKING[model] == filters['seeking'])
+  if filters['upcoming']:
+    found.append(has_upcoming(model, now))
+  return found
+
+
+def genre_condition(model, genres, match):
+  # the generic ARRAY type has no overlap/contains operators, the list is
+  # bound as the column's varchar[]
+  return model.genres.op('@>' if match == 'all' else '&&')(genres)
+
+
+def columns(model, now):
+  return (
+    model.id,
+    model.name,
+    model.city,
+    model.state,
+    model.genres,
+    SEEKING[model].label('seeking'),
+    upcoming_count(model, now).label('upcoming_shows_count'),
+  )
+
+
+def browse(model, filters, now, page=1, page_size=50, facets_ttl=10):
+  # (rows, total, genre counts) for one page of matches. filters has
+  # genres, match ('any' or 'all'), state, city, seeking (None for
+  # either) and upcoming.
+  offset = (page - 1) * page_size
+  if db.engine.dialect.name != 'postgresql':
+    return browse_in_memory(model, filters, now, offset, page_size)
+
+  query = db.session.query(*columns(model, now), db.func.count().over().label('total'))\
+    .filter(*conditions(model, filters, now))
+  if filters['genres']:
+    query = query.filter(genre_condition(model, filters['genres'], filters['match']))
+  rows = query.order_by(model.name, model.id).limit(page_size).offset(offset).all()
+  total = rows[0].total if rows else 0
+  rows = [{key: value for key, value in row._asdict().items() if key != 'total'} for row in rows]
+
+  # the genres are not part of the key, every genre selection of
+  # the same other filters shares the counts
+  key = '%s:%s:%s:%s:%s' % (
+    model.__tablename__, filters['state'], filters['city'], filters['seeking'], filters['upcoming']
+  )
+  facets = facets_cache.get(key)
+  if facets is None:
+    facets = genre_counts(model, filters, now)
+    facets_cache.set(key, facets, facets_ttl)
+  return rows, total, facets
+
+
+def genre_counts(model, filters, now):
+  matching = db.session.query(db.func.unnest(model.genres).label('genre'))\
+    .filter(*conditions(model, filters, now))\
+    .subquery()
+  counts = dict(
+    db.session.query(matching.c.genre, db.func.count()).group_by(matching.c.genre)
+  )
+  return {genre.name: counts.get(genre.name, 0) for genre in Genre}
+
+
+def browse_in_memory(model, filters, now, offset, page_size):
+  # databases without array operators (SQLite in local setups): the
+  # other filters run in SQL, genres are matched and counted here
+  rows = db.session.query(*columns(model, now))\
+    .filter(*conditions(model, filters, now))\
+    .order_by(model.name, model.id).all()
+  counts = Counter(genre for row in rows for genre in set(row.genres or ()))
+  wanted = set(filters['genres'])
+  if wanted:
+    if filters['match'] == 'all':
+      rows = [row for row in rows if wanted.issubset(row.genres or ())]
+    else:
+      rows = [row for row in rows if not wanted.isdisjoint(row.genres or ())]
+  page = [row._asdict() for row in rows[offset:offset + page_size]]
+  return page, len(rows), {genre.name: counts[genre.name] for genre in Genre}
@@ -0,0 +1,163 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from flask import g, has_app_context
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+# Caches the data the read views hand to their templates (not the pages
+# themselves, the layout renders per-user flash messages). Entries live
+# in namespaces such as 'venues', 'shows' or 'venue:3'. Each namespace
+# has a generation number that is part of every key in it, so a write
+# invalidates all the variants of a page (cursors, filters) by bumping
+# the generation instead of tracking the individual keys.
+
+
+class NullBackend:
+  # caching disabled, every lookup misses
+
+  def get(self, key):
+    return None
+
+  def set(self, key, value, ttl):
+    pass
+
+  def generation(self, namespace):
+    return 0
+
+  def bump(self, namespace):
+    pass
+
+
+class LRUBackend:
+  # in-process, per worker. Generations are kept apart from the entries
+  # so eviction can never bring back an invalidated page. Only for a
+  # single process: other processes' invalidations never reach it.
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+    self.generations = defaultdict(int)
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      value, expires = entry
+      if expires < time.monotonic():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl):
+    with self.lock:
+      self.entries[key] = (value, time.monotonic() + ttl)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+
+  def generation(self, namespace):
+    return self.generations[namespace]
+
+  def bump(self, namespace):
+    with self.lock:
+      self.generations[namespace] += 1
+
+
+class RedisBackend:
+  # shared by all workers, works with any server speaking the Redis
+  # protocol. Needs the redis package.
+
+  def __init__(self, url):
+    import redis
+    self.client = redis.Redis.from_url(url)
+
+  def get(self, key):
+    value = self.client.get(key)
+    return None if value is None else pickle.loads(value)
+
+  def set(self, key, value, ttl):
+    self.client.set(key, pickle.dumps(value), ex=ttl)
+
+  def generation(self, namespace):
+    return int(self.client.get('gen:' + namespace) or 0)
+
+  def bump(self, namespace):
+    self.client.incr('gen:' + namespace)
+
+
+class Cache:
+
+  def __init__(self):
+    self.backend = NullBackend()
+    self.ttl = 60
+    self.hits = defaultdict(int)
+    self.misses = defaultdict(int)
+
+  def init_app(self, app):
+    kind = app.config.get('CACHE_BACKEND', 'null')
+    if kind == 'lru':
+      self.backend = LRUBackend(app.config.get('CACHE_MAX_ENTRIES', 1024))
+    elif kind == 'redis':
+      self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+    elif kind == 'null':
+      self.backend = NullBackend()
+    else:
+      raise ValueError('Unknown CACHE_BACKEND: ' + kind)
+    # pages also depend on the time (upcoming vs past), entries expire
+    # even when nothing is written
+    self.ttl = app.config.get('CACHE_TTL', 60)
+
+  def get_or_set(self, namespace, variant, compute, ttl=None):
+    # value of compute() for this variant of the namespace, computed on
+    # a miss only. ttl overrides CACHE_TTL for values that go stale sooner.
+    key, value = self.lookup(namespace, variant)
+    if value is None:
+      value = compute()
+      self.backend.set(key, value, ttl or self.ttl)
+    return value
+
+  async def get_or_set_async(self, namespace, variant, compute, ttl=None):
+    # get_or_set for the async views, compute() returns an awaitable
+    key, value = self.lookup(namespace, variant)
+    if value is None:
+      value = await compute()
+      self.backend.set(key, value, ttl or self.ttl)
+    return value
+
+  def lookup(self, namespace, variant):
+    # (key, cached value or None)
+    key = '%s:%d:%s' % (namespace, self.backend.generation(namespace), variant)
+    # hit/miss counts are grouped by page kind, not per entity
+    kind = namespace.split(':')[0]
+    if has_app_context() and g.get('cache_refresh'):
+      # a client reading its own writes (see replicas.py), the entry is
+      # recomputed and replaced
+      self.misses[kind] += 1
+      return key, None
+    value = self.backend.get(key)
+    if value is not None:
+      self.hits[kind] += 1
+    else:
+      self.misses[kind] += 1
+    return key, value
+
+  def invalidate(self, *namespaces):
+    for namespace in namespaces:
+      self.backend.bump(namespace)
+
+  def stats(self):
+    return {
+      kind: {'hits': self.hits[kind], 'misses': self.misses[kind]}
+      for kind in sorted(set(self.hits) | set(self.misses))
+    }
+
+
+cache = Cache()
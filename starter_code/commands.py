@@ -0,0 +1,98 @@
+import signal
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from counters import rollover, check
+from purge import purge_all
+from jobs import jobs, Worker
+from exporter import FORMATS, export_stream, export_parquet
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+# flask import, export, purge, worker, rollover-counters and check-counters,
+# registered by create_app. The importer is only loaded when 'flask import' runs,
+# web workers never need it.
+
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']),
+  help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+@click.option('--chunk-size', default=5000, show_default=True)
+@with_appcontext
+def import_command(kind, source, format, chunk_size):
+  """Bulk load venues, artists or shows from a CSV or NDJSON file."""
+  from importer import import_file
+  if format is None:
+    format = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+  imported, failed = import_file(kind, source, format, chunk_size)
+  click.echo('%d imported, %d failed' % (imported, failed))
+
+@click.command('rollover-counters')
+@with_appcontext
+def rollover_counters_command():
+  """Recount venues and artists whose next show has started. Run from cron."""
+  updated = rollover(datetime.now())
+  click.echo('%d counters rolled over' % updated)
+
+@click.command('check-counters')
+@click.option('--repair', is_flag=True, help='Recount the rows that drifted.')
+@with_appcontext
+def check_counters_command(repair):
+  """Compare the show counters with the shows table."""
+  drifted = check(datetime.now(), repair)
+  for model, id in drifted:
+    click.echo('%s %d drifted' % (model.__tablename__, id))
+  click.echo('%d drifted%s' % (len(drifted), ', repaired' if repair and drifted else ''))
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', type=click.Choice(FORMATS), default='csv', show_default=True)
+@click.option('--since', type=click.DateTime(), help='Only rows written after this time.')
+@with_appcontext
+def export_command(kind, output, format, since):
+  """Dump venues, artists or shows as CSV, NDJSON or Parquet."""
+  if format == 'parquet':
+    try:
+      export_parquet(kind, output, since)
+    except ImportError:
+      raise click.ClickException('Parquet export needs pyarrow installed.')
+    return
+  with click.open_file(output, 'w') as stream:
+    for chunk in export_stream(kind, format, since):
+      stream.write(chunk)
+
+@click.command('purge')
+@click.option('--batch-size', type=int, help='Shows per transaction, defaults to PURGE_BATCH_SIZE.')
+@with_appcontext
+def purge_command(batch_size):
+  """Delete the deleted venues and artists and their shows, in batches."""
+  purged = purge_all(batch_size or current_app.config['PURGE_BATCH_SIZE'], click.echo)
+  click.echo('%d purged' % purged)
+
+@click.command('worker')
+@click.option('--threads', type=int, help='Jobs run at once, defaults to JOB_THREADS.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+@with_appcontext
+def worker_command(threads, burst):
+  """Run the queued background jobs."""
+  worker = Worker(current_app._get_current_object(), threads or current_app.config['JOB_THREADS'])
+  # commits in this process (a job queueing another) wake it
+  jobs.worker = worker
+  # finishes the running jobs on ^C or a SIGTERM from the supervisor
+  for number in (signal.SIGINT, signal.SIGTERM):
+    signal.signal(number, lambda *args: worker.stop())
+  worker.run(burst)
+  click.echo('%d done, %d failed' % (worker.done, worker.failed))
+
+def init_app(app):
+  for command in (import_command, rollover_counters_command, check_counters_command, export_command, purge_command,
+      worker_command):
+    app.cli.add_command(command)
@@ -10,5 +10,89 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://Starlet@localhost:5432/fdb'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://Starlet@localhost:5432/fdb')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, per worker process. See pool.engine_options
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+# seconds before a connection is replaced, below any server/proxy idle timeout
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+# milliseconds, 0 disables
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
+# PgBouncer in transaction mode does the pooling
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0') == '1'
+
+# Read replicas, comma separated URLs. GET and HEAD requests read from
+# them, see replicas.py
+DATABASE_REPLICA_URLS = os.environ.get('DATABASE_REPLICA_URLS', '')
+# seconds between health checks of each replica
+REPLICA_CHECK_INTERVAL = int(os.environ.get('REPLICA_CHECK_INTERVAL', 10))
+# seconds of lag after which a Postgres replica is skipped, 0 disables
+REPLICA_MAX_LAG = int(os.environ.get('REPLICA_MAX_LAG', 5))
+# seconds a client reads from the primary after writing, keep it above
+# REPLICA_MAX_LAG + REPLICA_CHECK_INTERVAL
+READ_YOUR_WRITES_SECONDS = int(os.environ.get('READ_YOUR_WRITES_SECONDS', 15))
+
+# Async views for the read pages, querying through asyncpg. Only served
+# under the ASGI entry point (uvicorn asgi:app), see aio.py and asgi.py.
+ASYNC_READS = os.environ.get('ASYNC_READS', '0') == '1'
+# threads running the sync views under asgi.py, like gunicorn's --threads
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+
+# Background jobs, see jobs.py. Each web worker runs JOB_THREADS of them
+# unless JOBS_IN_PROCESS is off, then 'flask worker' runs them.
+JOBS_IN_PROCESS = os.environ.get('JOBS_IN_PROCESS', '1') == '1'
+JOB_THREADS = int(os.environ.get('JOB_THREADS', 2))
+# seconds between polls of the jobs table, a commit that queues a job
+# wakes the worker of its process at once
+JOB_POLL_INTERVAL = 5
+# seconds after which a job still running is taken as lost and run again
+JOB_TIMEOUT = 600
+# seconds before the first retry of a failed job, doubled every attempt
+JOB_RETRY_DELAY = 10
+# days finished jobs (and their idempotency keys) are kept
+JOB_RETENTION_DAYS = 7
+
+# Shows deleted per transaction when a deleted venue or artist is purged
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+
+# Shows listed per page on venue and artist pages
+SHOWS_PAGE_SIZE = 10
+
+# Shows listed per page on /shows
+SHOWS_LISTING_PAGE_SIZE = 30
+
+# Results listed per page on the search pages
+SEARCH_PAGE_SIZE = 50
+
+# Page data cache: 'null' (off), 'redis' (shared) or 'lru' (in process).
+# Writes invalidate through the backend, so 'lru' only sees the writes of
+# its own process: with several gunicorn workers, or next to 'flask
+# import', 'flask purge' and 'flask worker', its pages stay stale for up
+# to CACHE_TTL seconds. Use 'redis' there.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'null')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL = 60
+
+# Logging, written by a background thread. See logs.init_app. LOG_FILE is
+# shared by the workers and rotated outside the app (logrotate, without
+# copytruncate).
+LOG_FILE = os.environ.get('LOG_FILE', 'error.log')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# fraction of info records (one per request) kept, warnings and errors all are
+LOG_INFO_SAMPLE_RATE = float(os.environ.get('LOG_INFO_SAMPLE_RATE', 1.0))
+
+# Statements slower than this are logged with their parameters and view
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+
+# Seconds the genre counts of /api/v1/*/browse are cached, in each process
+# whatever CACHE_BACKEND is (see browse.py)
+FACETS_CACHE_TTL = 10
+
+# Seconds between full rebuilds of the /autocomplete index, which picks up
+# names written by other workers
+AUTOCOMPLETE_REBUILD = 300
@@ -0,0 +1,150 @@
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_shows_count, past_shows_count and
+# next_show_time. They are updated in the same transaction as the shows
+# they count. As time passes upcoming shows become past ones, so the
+# counters of an entity are only current while its next_show_time is
+# still ahead; rollover() refreshes the ones that fell behind and is
+# meant to run from cron ('flask rollover-counters').
+
+OWNERS = {
+  Venue: Show.venue_id,
+  Artist: Show.artist_id,
+}
+
+
+def show_counts(owner_column, owner_id, now):
+  # (upcoming, past) counts for one venue or artist in a single statement,
+  # both filters are plain start_time comparisons on the owner's shows
+  upcoming, past = show_counts_query(owner_column, owner_id, now).one()
+  return upcoming, past
+
+
+def show_counts_query(owner_column, owner_id, now):
+  return db.session.query(
+      db.func.count(Show.id).filter(Show.start_time > now),
+      db.func.count(Show.id).filter(Show.start_time <= now)
+    ).filter(owner_column == owner_id)
+
+
+def is_current(model, now):
+  # SQL condition: the row's counters are still exact at now
+  return db.or_(model.next_show_time == None, model.next_show_time > now)
+
+
+def counts(entity, now):
+  # (upcoming, past) for a loaded venue or artist, from its counters
+  # when they are current, otherwise counted from the shows
+  if counters_current(entity, now):
+    return entity.upcoming_shows_count, entity.past_shows_count
+  return show_counts(OWNERS[type(entity)], entity.id, now)
+
+
+def counters_current(entity, now):
+  # is_current for a loaded entity or row
+  return entity.next_show_time is None or entity.next_show_time > now
+
+
+def upcoming_count(model, now):
+  # SQL expression for the row's upcoming show count, reading the
+  # counter unless it is out of date
+  owner_column = OWNERS[model]
+  counted = db.select(db.func.count(Show.id))\
+    .where(owner_column == model.id, Show.start_time > now)\
+    .scalar_subquery()
+  return db.case((is_current(model, now), model.upcoming_shows_count), else_=counted)
+
+
+def has_upcoming(model, now):
+  # SQL condition: the row has a show after now. next_show_time answers
+  # it from ix_*_next_show_time unless the counters are out of date.
+  owner_column = OWNERS[model]
+  return db.or_(
+    model.next_show_time > now,
+    db.and_(
+      model.next_show_time <= now,
+      db.exists().where(owner_column == model.id, Show.start_time > now)
+    )
+  )
+
+
+def record_show(venue_id, artist_id, start_time, now):
+  # counts a newly inserted show on its venue and artist. Plain UPDATE
+  # expressions, so concurrent inserts do not lose counts.
+  for model, owner_id in ((Venue, venue_id), (Artist, artist_id)):
+    if start_time > now:
+      values = {
+        'upcoming_shows_count': model.upcoming_shows_count + 1,
+        'next_show_time': db.case(
+          (db.or_(model.next_show_time == None, model.next_show_time > start_time), start_time),
+          else_=model.next_show_time
+        ),
+      }
+    else:
+      values = {'past_shows_count': model.past_shows_count + 1}
+    model.query.filter(model.id == owner_id)\
+      .update(values, synchronize_session=False)
+
+
+def refresh(model, ids, now):
+  # recounts the given rows from their shows, in one UPDATE
+  owner_column = OWNERS[model]
+  shows = db.select(db.func.count(Show.id)).where(owner_column == model.id)
+  model.query.filter(model.id.in_(ids)).update({
+    'upcoming_shows_count': shows.where(Show.start_time > now).scalar_subquery(),
+    'past_shows_count': shows.where(Show.start_time <= now).scalar_subquery(),
+    'next_show_time': db.select(db.func.min(Show.start_time))
+      .where(owner_column == model.id, Show.start_time > now)
+      .scalar_subquery(),
+  }, synchronize_session=False)
+
+
+def rollover(now):
+  # refreshes every venue and artist whose next show has started,
+  # returns how many rows were updated
+  updated = 0
+  for model in OWNERS:
+    ids = [id for id, in db.session.query(model.id).filter(model.next_show_time <= now)]
+    if ids:
+      refresh(model, ids, now)
+      updated += len(ids)
+  db.session.commit()
+  return updated
+
+
+def check(now, repair=False):
+  # (model, id) of every row whose counters disagree with its shows,
+  # recounting them when repair is set
+  drifted = []
+  for model, owner_column in OWNERS.items():
+    expected = db.session.query(
+        owner_column.label('owner_id'),
+        db.func.count(Show.id).filter(Show.start_time > now).label('upcoming'),
+        db.func.count(Show.id).filter(Show.start_time <= now).label('past'),
+        db.func.min(Show.start_time).filter(Show.start_time > now).label('next_show_time')
+      ).group_by(owner_column).subquery()
+    rows = db.session.query(
+        model.id,
+        model.upcoming_shows_count,
+        model.past_shows_count,
+        model.next_show_time,
+        expected.c.upcoming,
+        expected.c.past,
+        expected.c.next_show_time.label('expected_next_show_time')
+      ).outerjoin(expected, expected.c.owner_id == model.id)\
+      .yield_per(1000)
+    ids = [
+      row.id for row in rows
+      if (row.upcoming_shows_count, row.past_shows_count, row.next_show_time)
+        != (row.upcoming or 0, row.past or 0, row.expected_next_show_time)
+    ]
+    if ids and repair:
+      for start in range(0, len(ids), 1000):
+        refresh(model, ids[start:start + 1000], now)
+    drifted.extend((model, id) for id in ids)
+  db.session.commit()
+  return drifted
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from models import db, Venue, Artist, Show
+from queries import YIELD_PER
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+# Dumps venues, artists or shows for analytics in constant memory: rows
+# come from a server-side cursor in partitions of YIELD_PER and are
+# written out as they arrive. With a since timestamp only rows written
+# after it are exported (updated_at for venues and artists, created_at
+# for shows, which are never edited).
+
+MODELS = {
+  'venues': (Venue, Venue.updated_at),
+  'artists': (Artist, Artist.updated_at),
+  'shows': (Show, Show.created_at),
+}
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+MIMETYPES = {
+  'csv': 'text/csv',
+  'ndjson': 'application/x-ndjson',
+}
+
+
+def table_columns(model):
+  # deleted rows are not exported, so neither is their deleted_at
+  return [column for column in model.__table__.columns if column.name != 'deleted_at']
+
+
+def columns(kind):
+  model, _ = MODELS[kind]
+  return [column.name for column in table_columns(model)]
+
+
+def export_rows(kind, since=None):
+  # batches of row dicts, ordered by id
+  model, changed = MODELS[kind]
+  query = db.select(*table_columns(model)).order_by(model.id)
+  # selects of the bare table are not filtered by models.hide_deleted
+  if model is Show:
+    # joined, which leaves out the shows of deleted venues and artists
+    query = query.join(Venue).join(Artist)
+  else:
+    query = query.where(model.deleted_at.is_(None))
+  if since is not None:
+    query = query.where(changed >= since)
+  result = db.session.execute(query.execution_options(stream_results=True))
+  for partition in result.mappings().partitions(YIELD_PER):
+    yield [dict(row) for row in partition]
+
+
+def plain(value):
+  # CSV cells: lists are ';'-separated like the import format
+  if isinstance(value, list):
+    return ';'.join(value)
+  if isinstance(value, datetime):
+    return value.isoformat()
+  return value
+
+
+def csv_chunks(kind, batches):
+  buffer = io.StringIO()
+  writer = csv.DictWriter(buffer, columns(kind))
+  writer.writeheader()
+  for batch in batches:
+    writer.writerows({key: plain(value) for key, value in row.items()} for row in batch)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+  yield buffer.getvalue()
+
+
+def ndjson_chunks(kind, batches):
+  for batch in batches:
+    yield ''.join(
+      json.dumps(row, default=lambda value: value.isoformat()) + '\n'
+      for row in batch
+    )
+
+
+def export_stream(kind, format, since=None):
+  # text chunks of a csv or ndjson export
+  batches = export_rows(kind, since)
+  if format == 'csv':
+    return csv_chunks(kind, batches)
+  return ndjson_chunks(kind, batches)
+
+
+def parquet_schema(kind):
+  import pyarrow
+
+  model, _ = MODELS[kind]
+  types = {
+    db.Integer: pyarrow.int64(),
+    db.String: pyarrow.string(),
+    db.Boolean: pyarrow.bool_(),
+    db.DateTime: pyarrow.timestamp('us'),
+    db.ARRAY: pyarrow.list_(pyarrow.string()),
+  }
+  return pyarrow.schema([
+    (column.name, next(arrow for sql, arrow in types.items() if isinstance(column.type, sql)))
+    for column in table_columns(model)
+  ])
+
+
+def export_parquet(kind, path, since=None):
+  # one row group per batch. Needs pyarrow.
+  import pyarrow
+  import pyarrow.parquet
+
+  schema = parquet_schema(kind)
+  with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+    for batch in export_rows(kind, since):
+      writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
@@ -1,3 +1,5 @@
+import os
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -5,14 +7,73 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # the test suite, then a small benchmark run compared with
+    # bench/baseline.json. Without a baseline there is nothing to compare
+    # with, which fails rather than passes the gate.
+    if not os.path.exists("bench/baseline.json"):
+        abort(
+            "No bench/baseline.json. Run 'fab bench' on the reference machine"
+            " and copy bench/latest.json there."
+        )
+    with settings(warn_only=True):
+        result = local("python -m pytest -q", capture=True)
+    print(result)
+    if result.failed and not confirm("Tests failed. Continue?"):
+        abort("Aborted at user request.")
+    bench(scale="small")
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m bench compare bench/baseline.json bench/latest.json",
+            capture=True
         )
-    if result.failed and not confirm("Tests failed. Continue?"):
+    print(result)
+    if result.failed and not confirm("Benchmark regressed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(scale="small", clients=8, requests=100):
+    # seeds a scratch database (BENCH_DATABASE_URL, a local SQLite file by
+    # default) and benchmarks every route into bench/latest.json
+    database = os.environ.get("BENCH_DATABASE_URL", "sqlite:///bench.db")
+    local("python -m bench seed --database {} --scale {}".format(database, scale))
+    local(
+        "python -m bench run --database {} --clients {} --requests {}"
+        " --output bench/latest.json".format(database, clients, requests)
+    )
+
+
+def bench_async(clients=500, requests=2000):
+    # the routes of the async views served by gunicorn (threads) and by
+    # uvicorn with ASYNC_READS on, against the Postgres database in
+    # BENCH_DATABASE_URL seeded beforehand with "python -m bench seed"
+    database = os.environ["BENCH_DATABASE_URL"]
+    servers = (
+        ("sync", "gunicorn -k gthread --threads 32 -b 127.0.0.1:8001 wsgi:app"),
+        ("async", "ASYNC_READS=1 uvicorn --port 8001 --no-access-log asgi:app"),
+    )
+    for mode, server in servers:
+        local(
+            "DATABASE_URL={} JOBS_IN_PROCESS=0 {} > bench/{}.log 2>&1 &"
+            " echo $! > bench/server.pid && sleep 5".format(database, server, mode)
+        )
+        try:
+            local(
+                "python -m bench run --database {} --url http://127.0.0.1:8001"
+                " --clients {} --requests {} --async-only --output bench/{}.json".format(
+                    database, clients, requests, mode
+                )
+            )
+        finally:
+            local("kill $(cat bench/server.pid) && rm bench/server.pid")
+    with settings(warn_only=True):
+        local("python -m bench compare bench/sync.json bench/async.json")
+
+
+def startup():
+    # import time of the gunicorn entry point and of the CLI's create_app()
+    local("python -m bench startup")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,8 +100,12 @@ def heroku():
 
 
 def heroku_test():
+    # read-only run against the deployed app, its data is left alone;
+    # ids are picked from the deployed database, requests go to the web url
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "python -m bench run --database \"$(heroku config:get DATABASE_URL)\""
+        " --url \"$(heroku info -s | grep web_url | cut -d= -f2)\""
+        " --clients 4 --requests 20 --output bench/heroku.json"
     )
 
 
@@ -0,0 +1,33 @@
+from datetime import timezone
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+PATTERNS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+# formatted strings kept, /shows repeats the same start times a lot
+FORMAT_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def compiled(format, locale):
+  # Babel parses the pattern and loads the locale data on every
+  # format_datetime call, do both once per (pattern, locale). Imported on
+  # the first page rendered, not at startup.
+  from babel import Locale
+  from babel.dates import parse_pattern
+  return parse_pattern(PATTERNS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def format_datetime(value, format='medium', locale='en'):
+  pattern, locale = compiled(format, locale)
+  # babel.dates.format_datetime treats naive datetimes as UTC
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=timezone.utc)
+  return pattern.apply(value, locale)
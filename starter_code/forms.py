@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange
 from enums import State, Genre
 
 
@@ -16,7 +16,14 @@ class ShowForm(Form):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
-        default=datetime.today()
+        # called per form, a value would be the time the module was imported
+        default=datetime.today
+    )
+    # minutes, the end of the booked slot
+    duration = IntegerField(
+        'duration',
+        validators=[NumberRange(min=1, max=24 * 60)],
+        default=120
     )
 
 class VenueForm(Form):
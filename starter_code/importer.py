@@ -0,0 +1,204 @@
+import csv
+import json
+import sys
+from datetime import datetime, timedelta
+from itertools import islice
+
+from wtforms import BooleanField, SelectMultipleField
+from wtforms.fields.core import UnboundField
+from wtforms.validators import StopValidation, ValidationError
+
+from forms import VenueForm, ArtistForm
+from models import db, Venue, Artist, Show, DEFAULT_DURATION
+from cache import cache
+from counters import refresh
+from scheduling import check_tour
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Loads venues, artists or shows from CSV or NDJSON in chunks. Rows are
+# checked against the same rules as the create forms, but the rules are
+# read off the form class once instead of building a form per row, and
+# valid rows go to the database as one executemany INSERT per chunk.
+
+
+class RowField:
+  # the part of a WTForms field the stock validators look at
+
+  def __init__(self, data):
+    self.data = data
+    self.errors = []
+
+  def gettext(self, string):
+    return string
+
+  def ngettext(self, singular, plural, n):
+    return singular if n == 1 else plural
+
+
+class RowValidator:
+
+  def __init__(self, form_class):
+    self.fields = {}
+    for name in dir(form_class):
+      field = getattr(form_class, name)
+      if not isinstance(field, UnboundField):
+        continue
+      choices = field.kwargs.get('choices')
+      if callable(choices):
+        choices = choices()
+      self.fields[name] = (
+        field.field_class,
+        field.kwargs.get('validators', []),
+        {choice[0] for choice in choices} if choices else None
+      )
+
+  def clean(self, row):
+    # (values, errors) for one raw row, values are converted the way the
+    # form would convert them
+    values = {}
+    errors = []
+    for name, (field_class, validators, choices) in self.fields.items():
+      value = row.get(name)
+      if field_class is SelectMultipleField:
+        if isinstance(value, str):
+          value = [item.strip() for item in value.split(';') if item.strip()]
+        value = value or []
+      elif field_class is BooleanField:
+        if isinstance(value, str):
+          value = value.strip().lower() in ('1', 'true', 'y', 'yes', 'on')
+        value = bool(value)
+      elif value is not None:
+        value = str(value)
+
+      field = RowField(value)
+      try:
+        for validator in validators:
+          validator(None, field)
+      except (StopValidation, ValidationError) as error:
+        errors.append('%s: %s' % (name, error))
+        continue
+      if choices is not None and value:
+        invalid = [item for item in (value if isinstance(value, list) else [value]) if item not in choices]
+        if invalid:
+          errors.append('%s: not a valid choice: %s' % (name, ', '.join(invalid)))
+          continue
+      values[name] = value
+    return values, errors
+
+
+class ShowValidator:
+  # shows only need existing venue and artist ids, known up front
+
+  def __init__(self):
+    self.venue_ids = {id for id, in db.session.query(Venue.id)}
+    self.artist_ids = {id for id, in db.session.query(Artist.id)}
+
+  def clean(self, row):
+    values = {}
+    errors = []
+    for name, known in (('venue_id', self.venue_ids), ('artist_id', self.artist_ids)):
+      try:
+        values[name] = int(row.get(name))
+      except (TypeError, ValueError):
+        errors.append('%s: not an id' % name)
+        continue
+      if values[name] not in known:
+        errors.append('%s: no such id %d' % (name, values[name]))
+    try:
+      values['start_time'] = datetime.fromisoformat(str(row.get('start_time')))
+    except ValueError:
+      errors.append('start_time: not an ISO date and time')
+      return values, errors
+    # an end_time, or a duration in minutes, or the default duration
+    try:
+      if row.get('end_time'):
+        values['end_time'] = datetime.fromisoformat(str(row['end_time']))
+      elif row.get('duration'):
+        values['end_time'] = values['start_time'] + timedelta(minutes=int(row['duration']))
+      else:
+        values['end_time'] = values['start_time'] + DEFAULT_DURATION
+    except ValueError:
+      errors.append('end_time: not an ISO date and time, nor a duration in minutes')
+    return values, errors
+
+
+TARGETS = {
+  'venues': (Venue, lambda: RowValidator(VenueForm)),
+  'artists': (Artist, lambda: RowValidator(ArtistForm)),
+  'shows': (Show, ShowValidator),
+}
+
+
+def read_rows(stream, format):
+  if format == 'csv':
+    return csv.DictReader(stream)
+  return (json.loads(line) for line in stream if line.strip())
+
+
+def import_file(kind, stream, format='csv', chunk_size=5000, report=sys.stderr):
+  # returns (imported, failed). Invalid rows are reported by line and
+  # skipped, a chunk the database rejects is rolled back as a whole.
+  model, make_validator = TARGETS[kind]
+  validator = make_validator()
+  rows = enumerate(read_rows(stream, format), start=2 if format == 'csv' else 1)
+  imported = failed = 0
+  # venues and artists whose pages imported shows change
+  touched = {Venue: set(), Artist: set()}
+  while True:
+    chunk = list(islice(rows, chunk_size))
+    if not chunk:
+      break
+    batch = []
+    lines = []
+    for line, row in chunk:
+      values, errors = validator.clean(row)
+      if errors:
+        failed += 1
+        print('line %d: %s' % (line, '; '.join(errors)), file=report)
+      else:
+        batch.append(values)
+        lines.append(line)
+    if model is Show:
+      # a tour is checked as a whole, against the booked shows and
+      # within the chunk
+      conflicts = check_tour(batch)
+      for position in sorted(conflicts):
+        failed += 1
+        print('line %d: %s' % (lines[position], ' '.join(conflicts[position])), file=report)
+      batch = [values for position, values in enumerate(batch) if position not in conflicts]
+    if not batch:
+      continue
+    try:
+      db.session.execute(model.__table__.insert(), batch)
+      if model is Show:
+        touch_owners(batch, touched)
+      db.session.commit()
+      imported += len(batch)
+    except Exception as error:
+      db.session.rollback()
+      failed += len(batch)
+      print('lines %d-%d: %s' % (chunk[0][0], chunk[-1][0], error), file=report)
+  if kind == 'shows':
+    cache.invalidate('venues', 'shows', *(
+      '%s:%d' % (owner.__tablename__, id)
+      for owner, ids in touched.items()
+      for id in ids
+    ))
+  else:
+    cache.invalidate(kind)
+  return imported, failed
+
+
+def touch_owners(batch, touched):
+  # bumps updated_at and recounts the show counters of the venues and
+  # artists of a batch of shows
+  now = datetime.now()
+  for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+    ids = {values[key] for values in batch}
+    model.query.filter(model.id.in_(ids))\
+      .update({'updated_at': now}, synchronize_session=False)
+    refresh(model, ids, now)
+    touched[model] |= ids
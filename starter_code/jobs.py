@@ -0,0 +1,250 @@
+import logging
+import threading
+import traceback
+from concurrent import futures
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+
+# Side effects a write does not need to wait for (purging a deleted
+# venue, refreshing the pages of the artists it lists) are queued as
+# rows of the jobs table by jobs.enqueue(). The row is written in the
+# request's transaction, so a job exists exactly when the write
+# committed, and it survives restarts. Workers claim due jobs and run
+# their handlers on a thread pool. A job that raises is retried after
+# JOB_RETRY_DELAY seconds, doubled on every attempt, and marked failed
+# after max_attempts. A worker that dies mid-job leaves it running;
+# after JOB_TIMEOUT seconds another worker takes it over.
+#
+# With JOBS_IN_PROCESS (the default) each web worker runs a worker of
+# JOB_THREADS threads, woken by the commits that queue jobs. Otherwise
+# 'flask worker' runs them, as many processes as needed. A job can run
+# more than once (retries, a worker dying after its handler finished),
+# so handlers must be safe to repeat.
+
+log = logging.getLogger('app.jobs')
+
+# INSERT ... ON CONFLICT DO NOTHING, for idempotency keys
+INSERTS = {
+  'postgresql': postgresql.insert,
+  'sqlite': sqlite.insert,
+}
+
+
+def claim(limit, timeout):
+  # ids of up to limit due jobs, marked running by this worker
+  now = datetime.now()
+  due = or_(
+    and_(Job.status == 'queued', Job.run_at <= now),
+    # its worker died
+    and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=timeout))
+  )
+  # Postgres skips the rows other workers are claiming; elsewhere the
+  # status check in the UPDATE decides who got a job
+  ids = [id for id, in db.session.query(Job.id).filter(due)
+    .order_by(Job.run_at).limit(limit).with_for_update(skip_locked=True)]
+  claimed = [
+    id for id in ids
+    if Job.query.filter(Job.id == id, due).update({
+      'status': 'running',
+      'locked_at': now,
+      'attempts': Job.attempts + 1,
+    }, synchronize_session=False)
+  ]
+  db.session.commit()
+  return claimed
+
+
+class Worker:
+
+  def __init__(self, app, threads):
+    self.app = app
+    self.threads = threads
+    self.poll_interval = app.config['JOB_POLL_INTERVAL']
+    self.timeout = app.config['JOB_TIMEOUT']
+    self.retry_delay = app.config['JOB_RETRY_DELAY']
+    self.retention = timedelta(days=app.config['JOB_RETENTION_DAYS'])
+    self.pool = futures.ThreadPoolExecutor(threads, thread_name_prefix='job')
+    self.wake = threading.Event()
+    self.cleaned_at = None
+    self.stopping = False
+    self.done = 0
+    self.failed = 0
+
+  def run(self, burst=False):
+    # claims jobs while threads are free; burst returns once nothing is
+    # due or running, stop() once the running jobs finish
+    running = set()
+    while not self.stopping:
+      running = {future for future in running if not future.done()}
+      claimed = []
+      if len(running) < self.threads:
+        with self.app.app_context():
+          try:
+            self.clean()
+            claimed = claim(self.threads - len(running), self.timeout)
+          except Exception:
+            # the database is away, try again at the next poll
+            log.exception('Could not claim jobs')
+            db.session.rollback()
+        for index, id in enumerate(claimed):
+          try:
+            running.add(self.pool.submit(self.perform, id))
+          except RuntimeError:
+            # the pool was shut down, the interpreter is exiting
+            self.stop()
+            self.release(claimed[index:])
+            break
+        if claimed and not self.stopping:
+          continue
+      if burst and not running:
+        return
+      if running and (burst or len(running) == self.threads):
+        futures.wait(running, self.poll_interval, futures.FIRST_COMPLETED)
+      else:
+        self.wake.wait(self.poll_interval)
+        self.wake.clear()
+    futures.wait(running)
+
+  def stop(self):
+    # no more claims, run() returns when the running jobs are done
+    self.stopping = True
+    self.wake.set()
+
+  def release(self, job_ids):
+    # claimed jobs that will not run here, queued again as they were
+    with self.app.app_context():
+      try:
+        Job.query.filter(Job.id.in_(job_ids), Job.status == 'running').update({
+          'status': 'queued',
+          'locked_at': None,
+          'attempts': Job.attempts - 1,
+        }, synchronize_session=False)
+        db.session.commit()
+      except Exception:
+        # they are taken over after JOB_TIMEOUT
+        log.exception('Could not release jobs %s', job_ids)
+        db.session.rollback()
+
+  def perform(self, job_id):
+    with self.app.app_context():
+      job = Job.query.get(job_id)
+      handler = jobs.handlers.get(job.kind)
+      try:
+        if handler is None:
+          raise LookupError('No handler for %s jobs' % job.kind)
+        handler(**job.payload)
+      except Exception:
+        db.session.rollback()
+        job = Job.query.get(job_id)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+          job.status = 'failed'
+          self.failed += 1
+          log.error('Job %d (%s) failed after %d attempts', job.id, job.kind, job.attempts)
+        else:
+          job.status = 'queued'
+          job.run_at = datetime.now() + timedelta(seconds=self.retry_delay * 2 ** (job.attempts - 1))
+          log.warning('Job %d (%s) failed, retrying at %s', job.id, job.kind, job.run_at)
+      else:
+        job.status = 'done'
+        job.finished_at = datetime.now()
+        self.done += 1
+      db.session.commit()
+
+  def clean(self):
+    # deletes the jobs done more than JOB_RETENTION_DAYS ago, once an
+    # hour; their idempotency keys can be used again after that
+    now = datetime.now()
+    if self.cleaned_at is not None and now - self.cleaned_at < timedelta(hours=1):
+      return
+    self.cleaned_at = now
+    Job.query.filter(Job.status == 'done', Job.finished_at < now - self.retention)\
+      .delete(synchronize_session=False)
+    db.session.commit()
+
+
+class Jobs:
+
+  def __init__(self):
+    self.handlers = {}
+    self.max_attempts = {}
+    self.app = None
+    self.in_process = False
+    self.lock = threading.Lock()
+    # the worker woken by commits in this process: the in-process one,
+    # or the one 'flask worker' runs
+    self.worker = None
+
+  def init_app(self, app):
+    self.app = app
+    self.in_process = app.config['JOBS_IN_PROCESS']
+
+  def handler(self, kind, max_attempts=5):
+    # registers the function running the jobs of this kind, called with
+    # the job's payload as keyword arguments
+    def register(func):
+      self.handlers[kind] = func
+      self.max_attempts[kind] = max_attempts
+      return func
+    return register
+
+  def enqueue(self, kind, payload, key=None, delay=0):
+    # queues a job in the current transaction. With a key, a job with
+    # the same key already queued (or done within JOB_RETENTION_DAYS)
+    # means this one is dropped.
+    values = {
+      'kind': kind,
+      'payload': payload,
+      'idempotency_key': key,
+      'max_attempts': self.max_attempts[kind],
+      'run_at': datetime.now() + timedelta(seconds=delay),
+    }
+    insert = INSERTS.get(db.engine.dialect.name)
+    if key is not None and insert is not None:
+      statement = insert(Job.__table__).values(values).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    else:
+      statement = Job.__table__.insert().values(values)
+    db.session.execute(statement)
+    db.session.info['jobs_queued'] = True
+
+  def wake(self):
+    if self.worker is None:
+      if not self.in_process:
+        return
+      self.start()
+    self.worker.wake.set()
+
+  def start(self):
+    # the in-process worker, started on first use (threads do not
+    # survive gunicorn's fork)
+    with self.lock:
+      if self.worker is None:
+        self.worker = Worker(self.app, self.app.config['JOB_THREADS'])
+        threading.Thread(target=self.worker.run, name='jobs', daemon=True).start()
+
+  def stats(self):
+    # jobs per status
+    return dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status))
+
+
+jobs = Jobs()
+
+
+@event.listens_for(Session, 'after_commit')
+def queued(session):
+  if session.info.pop('jobs_queued', False):
+    jobs.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def dropped(session):
+  session.info.pop('jobs_queued', None)
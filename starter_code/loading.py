@@ -0,0 +1,28 @@
+from sqlalchemy.orm import load_only, raiseload
+
+from models import Artist
+
+#----------------------------------------------------------------------------#
+# Load profiles.
+#----------------------------------------------------------------------------#
+
+# The relationships on the models load lazily by default. Each view loads
+# its rows through load(), so the shows it needs come back in a fixed
+# number of statements and anything it does not expect to touch raises
+# instead of silently issuing one query per row.
+
+# a venue or artist on its own: its columns, none of its relationships.
+# The show lists of the detail pages are paged separately by
+# queries.show_page.
+ROW = (raiseload('*'),)
+
+PROFILES = {
+  Artist: {
+    'list': (load_only(Artist.id, Artist.name), raiseload('*')),
+  },
+}
+
+
+def load(model, profile=None):
+  # returns model.query with the named profile applied, ROW by default
+  return model.query.options(*(PROFILES[model][profile] if profile else ROW))
@@ -0,0 +1,109 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+# Request threads only format a record and put it on a queue, a listener
+# thread does the writing, so a slow disk never holds up a response.
+# Records are written as JSON lines tagged with the request id, which is
+# also sent back in the X-Request-ID header.
+
+
+class RequestContext(logging.Filter):
+  # tags records logged while handling a request. Runs in the request
+  # thread, the listener has no request context.
+
+  def filter(self, record):
+    if has_request_context():
+      record.request_id = g.get('request_id')
+      record.method = request.method
+      record.path = request.path
+    return True
+
+
+class Sampling(logging.Filter):
+  # keeps a fraction of the records below WARNING, warnings and errors
+  # are always kept
+
+  def __init__(self, rate):
+    super().__init__()
+    self.rate = rate
+
+  def filter(self, record):
+    return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+
+  # set by RequestContext, or passed with extra=
+  FIELDS = (
+    'request_id', 'method', 'path', 'status', 'duration_ms',
+    'view', 'statement', 'parameters'
+  )
+
+  def format(self, record):
+    entry = {
+      'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+    }
+    for name in self.FIELDS:
+      value = getattr(record, name, None)
+      if value is not None:
+        entry[name] = value
+    if record.exc_info:
+      entry['exception'] = self.formatException(record.exc_info)
+    return json.dumps(entry, default=str)
+
+
+def init_app(app):
+  records = queue.SimpleQueue()
+  handler = QueueHandler(records)
+  # prepare() formats in the request thread, the file gets the line as is
+  handler.setFormatter(JSONFormatter())
+  handler.addFilter(RequestContext())
+  handler.addFilter(Sampling(app.config['LOG_INFO_SAMPLE_RATE']))
+  handler.setLevel(app.config['LOG_LEVEL'])
+
+  # every gunicorn worker appends to LOG_FILE, so none of them may rotate
+  # it: logrotate moves it and each worker reopens it on its next record
+  writer = WatchedFileHandler(app.config['LOG_FILE'])
+  writer.setFormatter(logging.Formatter('%(message)s'))
+  listener = QueueListener(records, writer)
+  listener.start()
+  # flushes what is still queued on shutdown
+  atexit.register(listener.stop)
+
+  app.logger.setLevel(app.config['LOG_LEVEL'])
+  # Flask's own handler writes to stderr from the request thread
+  app.logger.removeHandler(default_handler)
+  app.logger.addHandler(handler)
+  return listener
+
+
+def start_request():
+  # the caller's id when a proxy or client sent one
+  g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+  g.request_start = time.perf_counter()
+
+
+def finish_request(app, response):
+  response.headers['X-Request-ID'] = g.request_id
+  app.logger.info('%s %s %d', request.method, request.path, response.status_code, extra={
+    'status': response.status_code,
+    'duration_ms': round((time.perf_counter() - g.request_start) * 1000, 2),
+  })
+  return response
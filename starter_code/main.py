@@ -0,0 +1,113 @@
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    render_template,
+    request,
+    stream_with_context
+  )
+
+from models import db, Venue, Artist
+from autocomplete import complete
+from cache import cache
+from pool import pool_stats
+from replicas import replicas
+from jobs import jobs
+from exporter import MIMETYPES, export_stream
+from pages import parse_date
+import metrics
+
+#----------------------------------------------------------------------------#
+# Home, exports and worker stats.
+#----------------------------------------------------------------------------#
+
+main = Blueprint('main', __name__)
+
+@main.route('/')
+def index():
+  return render_template('pages/home.html')
+
+@main.route('/cache/stats')
+def cache_stats():
+  # hit/miss counters of this worker's page data cache
+  return cache.stats()
+
+@main.route('/pool/stats')
+def pool_stats_view():
+  # connection pool state and checkout metrics of this worker
+  stats = pool_stats(db.engine)
+  if replicas.engines:
+    stats['replicas'] = replicas.stats()
+  return stats
+
+@main.route('/jobs/stats')
+def jobs_stats():
+  # background jobs per status, see jobs.py
+  return jobs.stats()
+
+@main.route('/metrics')
+def metrics_view():
+  # request, SQL and template timings per view, with the cache and pool
+  # counters, for Prometheus to scrape
+  samples = []
+  for kind, counts in cache.stats().items():
+    for outcome in ('hits', 'misses'):
+      samples.append(('fyyur_cache_%s_total' % outcome, {'kind': kind}, counts[outcome]))
+  for name, value in pool_stats(db.engine).items():
+    if isinstance(value, (int, float)):
+      samples.append(('fyyur_pool_' + name, {}, value))
+  for name, stats in replicas.stats().items():
+    samples.append(('fyyur_replica_healthy', {'bind': name}, int(stats['healthy'])))
+  # the queue is shared, every worker reports the same counts
+  for status, count in jobs.stats().items():
+    samples.append(('fyyur_jobs', {'status': status}, count))
+  return Response(metrics.registry.exposition(samples), mimetype='text/plain; version=0.0.4')
+
+@main.route('/autocomplete')
+def autocomplete():
+  # venue and artist names for the search boxes, ?q=prefix&kind=venues|artists
+  term = request.args.get('q', '')
+  limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+  kinds = {'venues': Venue, 'artists': Artist}
+  kind = request.args.get('kind')
+  if kind:
+    if kind not in kinds:
+      abort(400)
+    kinds = {kind: kinds[kind]}
+  return {
+    kind: complete(model, term, limit, current_app.config['AUTOCOMPLETE_REBUILD'])
+    for kind, model in kinds.items()
+  }
+
+#  Export
+#  ----------------------------------------------------------------
+
+@main.route('/export/<any(venues, artists, shows):kind>')
+def export(kind):
+  # streamed csv (default) or ndjson dump, ?since= for rows written
+  # after an ISO timestamp
+  format = request.args.get('format', 'csv')
+  if format not in MIMETYPES:
+    abort(400)
+  try:
+    since = parse_date(request.args.get('since'))
+  except ValueError:
+    abort(400)
+  response = Response(
+    stream_with_context(export_stream(kind, format, since)),
+    mimetype=MIMETYPES[format]
+  )
+  response.headers['Content-Disposition'] = 'attachment; filename=%s.%s' % (kind, format)
+  return response
+
+#  Errors
+#  ----------------------------------------------------------------
+
+@main.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+@main.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import g, has_app_context, request
+from jinja2 import Template
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+# Times every request, the templates it renders and the statements it
+# runs. The numbers of one request go out in its Server-Timing header,
+# the totals per view are served in the Prometheus text format on
+# /metrics (per worker, like /cache/stats). Statements slower than
+# SLOW_QUERY_MS are logged with their parameters and the view that ran
+# them.
+
+# upper bounds, in seconds, of the request duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_queries = logging.getLogger('app.slow_query')
+
+
+class RequestTimings:
+  # collected on g while a request is handled
+
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.sql_count = 0
+    self.sql_seconds = 0.0
+    self.template_seconds = 0.0
+
+
+class ViewMetrics:
+
+  def __init__(self):
+    self.requests = 0
+    self.seconds = 0.0
+    self.sql_count = 0
+    self.sql_seconds = 0.0
+    self.template_seconds = 0.0
+    self.buckets = [0] * len(BUCKETS)
+
+
+class Metrics:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.views = defaultdict(ViewMetrics)
+    self.statuses = defaultdict(int)
+    self.slow_query_seconds = 0.5
+
+  def record(self, view, status, timings, seconds):
+    with self.lock:
+      metrics = self.views[view]
+      metrics.requests += 1
+      metrics.seconds += seconds
+      metrics.sql_count += timings.sql_count
+      metrics.sql_seconds += timings.sql_seconds
+      metrics.template_seconds += timings.template_seconds
+      bucket = bisect_left(BUCKETS, seconds)
+      if bucket < len(BUCKETS):
+        metrics.buckets[bucket] += 1
+      self.statuses[(view, status)] += 1
+
+  def exposition(self, samples=()):
+    # Prometheus text format, samples are extra (name, labels, value)
+    with self.lock:
+      views = sorted(self.views.items())
+      statuses = sorted(self.statuses.items())
+    lines = ['# TYPE fyyur_requests_total counter']
+    for (view, status), count in statuses:
+      lines.append('fyyur_requests_total{view="%s",status="%d"} %d' % (view, status, count))
+    lines.append('# TYPE fyyur_request_duration_seconds histogram')
+    for view, metrics in views:
+      cumulative = 0
+      for bound, count in zip(BUCKETS, metrics.buckets):
+        cumulative += count
+        lines.append('fyyur_request_duration_seconds_bucket{view="%s",le="%s"} %d' % (view, bound, cumulative))
+      lines.append('fyyur_request_duration_seconds_bucket{view="%s",le="+Inf"} %d' % (view, metrics.requests))
+      lines.append('fyyur_request_duration_seconds_sum{view="%s"} %f' % (view, metrics.seconds))
+      lines.append('fyyur_request_duration_seconds_count{view="%s"} %d' % (view, metrics.requests))
+    for name, kind, attribute in (
+      ('fyyur_sql_statements_total', 'counter', 'sql_count'),
+      ('fyyur_sql_seconds_total', 'counter', 'sql_seconds'),
+      ('fyyur_template_seconds_total', 'counter', 'template_seconds'),
+    ):
+      lines.append('# TYPE %s %s' % (name, kind))
+      for view, metrics in views:
+        lines.append('%s{view="%s"} %s' % (name, view, getattr(metrics, attribute)))
+    for name, labels, value in samples:
+      label_text = ','.join('%s="%s"' % item for item in sorted(labels.items()))
+      lines.append('%s{%s} %s' % (name, label_text, value) if label_text else '%s %s' % (name, value))
+    return '\n'.join(lines) + '\n'
+
+
+registry = Metrics()
+
+
+def current_timings():
+  if has_app_context():
+    return g.get('timings')
+  return None
+
+
+class TimedTemplate(Template):
+  # extended and included templates are rendered inside the outer
+  # render() call, so each page is timed once
+
+  def render(self, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+      return super().render(*args, **kwargs)
+    finally:
+      timings = current_timings()
+      if timings is not None:
+        timings.template_seconds += time.perf_counter() - start
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  # kept on the statement's execution context, not the connection: a
+  # statement that raises gets no after_cursor_execute, and its context
+  # goes away with it
+  if context is not None:
+    context._query_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  start = getattr(context, '_query_start', None)
+  if start is None:
+    return
+  seconds = time.perf_counter() - start
+  timings = current_timings()
+  if timings is not None:
+    timings.sql_count += 1
+    timings.sql_seconds += seconds
+  if seconds >= registry.slow_query_seconds:
+    slow_queries.warning('slow query, %.1f ms', seconds * 1000, extra={
+      'duration_ms': round(seconds * 1000, 2),
+      'statement': statement,
+      'parameters': parameters,
+      'view': request.endpoint if timings is not None else None,
+    })
+
+
+def init_app(app, engines):
+  registry.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+  # before any template is loaded, the environment caches them
+  app.jinja_env.template_class = TimedTemplate
+  for engine in engines:
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def start_request():
+  g.timings = RequestTimings()
+
+
+def finish_request(response):
+  timings = g.timings
+  seconds = time.perf_counter() - timings.start
+  registry.record(request.endpoint or 'unmatched', response.status_code, timings, seconds)
+  response.headers['Server-Timing'] = ', '.join((
+    'app;dur=%.1f' % (seconds * 1000),
+    'db;dur=%.1f;desc="%d queries"' % (timings.sql_seconds * 1000, timings.sql_count),
+    'tpl;dur=%.1f' % (timings.template_seconds * 1000),
+  ))
+  return response
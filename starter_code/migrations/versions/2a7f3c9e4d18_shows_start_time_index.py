@@ -0,0 +1,25 @@
+"""shows start_time index
+
+Revision ID: 2a7f3c9e4d18
+Revises: 9d4b6a2e0c51
+Create Date: 2026-10-18 11:48:52.631027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a7f3c9e4d18'
+down_revision = '9d4b6a2e0c51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset order and date range filter of the /shows listing
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
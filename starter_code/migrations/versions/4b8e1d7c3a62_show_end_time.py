@@ -0,0 +1,45 @@
+"""show end_time and no-overlap constraints
+
+Revision ID: 4b8e1d7c3a62
+Revises: e5d7c2a9b140
+Create Date: 2026-10-18 18:24:07.513920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e1d7c3a62'
+down_revision = 'e5d7c2a9b140'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows get the default two hours, cut short where the next
+    # show of the same venue or artist starts so the constraints hold
+    op.execute(
+        "UPDATE shows SET end_time = LEAST(shows.start_time + interval '2 hours', next.venue_start, next.artist_start) "
+        "FROM (SELECT id, "
+        "lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS venue_start, "
+        "lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS artist_start "
+        "FROM shows) AS next "
+        "WHERE next.id = shows.id"
+    )
+    op.alter_column('shows', 'end_time', nullable=False)
+    # integer equality in a GiST index
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for owner in ('venue', 'artist'):
+        op.execute(
+            'ALTER TABLE shows ADD CONSTRAINT shows_{owner}_no_overlap '
+            'EXCLUDE USING gist ({owner}_id WITH =, tsrange(start_time, end_time) WITH &&)'
+            .format(owner=owner)
+        )
+
+
+def downgrade():
+    for owner in ('artist', 'venue'):
+        op.execute('ALTER TABLE shows DROP CONSTRAINT shows_{owner}_no_overlap'.format(owner=owner))
+    op.drop_column('shows', 'end_time')
@@ -0,0 +1,30 @@
+"""search trigram indexes
+
+Revision ID: 5c2e8f1a7b3d
+Revises: a41df54255ce
+Create Date: 2026-10-18 10:12:40.218311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8f1a7b3d'
+down_revision = 'a41df54255ce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pg_trgm GIN indexes let name ILIKE '%term%' use an index scan
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False,
+        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_trgm', table_name='artist')
+    op.drop_index('ix_venue_name_trgm', table_name='venue')
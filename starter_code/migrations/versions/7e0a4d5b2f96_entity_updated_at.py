@@ -0,0 +1,26 @@
+"""entity updated_at
+
+Revision ID: 7e0a4d5b2f96
+Revises: 2a7f3c9e4d18
+Create Date: 2026-10-18 13:26:05.417793
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e0a4d5b2f96'
+down_revision = '2a7f3c9e4d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venue', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.add_column('artist', sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+
+def downgrade():
+    op.drop_column('artist', 'updated_at')
+    op.drop_column('venue', 'updated_at')
@@ -0,0 +1,31 @@
+"""venue and artist deleted_at
+
+Revision ID: 8f3a6c1d2e47
+Revises: 4b8e1d7c3a62
+Create Date: 2026-10-18 18:45:12.204391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a6c1d2e47'
+down_revision = '4b8e1d7c3a62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.create_index(
+            'ix_{}_deleted_at'.format(table), table, ['deleted_at'],
+            postgresql_where=sa.text('deleted_at IS NOT NULL')
+        )
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index('ix_{}_deleted_at'.format(table), table_name=table)
+        op.drop_column(table, 'deleted_at')
@@ -0,0 +1,34 @@
+"""shows and area indexes
+
+Revision ID: 9d4b6a2e0c51
+Revises: 5c2e8f1a7b3d
+Create Date: 2026-10-18 11:03:17.904562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b6a2e0c51'
+down_revision = '5c2e8f1a7b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # detail pages, their past/upcoming counts and the delete cascade all
+    # filter shows on one side and range over start_time
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_venue_genres', 'venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'artist', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_venue_city_state', 'venue', ['city', 'state'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_city_state', table_name='venue')
+    op.drop_index('ix_artist_genres', table_name='artist')
+    op.drop_index('ix_venue_genres', table_name='venue')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,24 @@
+"""show created_at
+
+Revision ID: c3b91e6f0a27
+Revises: 7e0a4d5b2f96
+Create Date: 2026-10-18 15:02:44.761385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3b91e6f0a27'
+down_revision = '7e0a4d5b2f96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+
+def downgrade():
+    op.drop_column('shows', 'created_at')
@@ -0,0 +1,40 @@
+"""show counters
+
+Revision ID: e5d7c2a9b140
+Revises: c3b91e6f0a27
+Create Date: 2026-10-18 15:51:30.128406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5d7c2a9b140'
+down_revision = 'c3b91e6f0a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, owner in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+        op.create_index(op.f('ix_%s_next_show_time' % table), table, ['next_show_time'], unique=False)
+        # backfill from the existing shows
+        op.execute(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM shows WHERE shows.{owner} = {table}.id AND shows.start_time > now()), '
+            'past_shows_count = (SELECT count(*) FROM shows WHERE shows.{owner} = {table}.id AND shows.start_time <= now()), '
+            'next_show_time = (SELECT min(start_time) FROM shows WHERE shows.{owner} = {table}.id AND shows.start_time > now())'
+            .format(table=table, owner=owner)
+        )
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_index(op.f('ix_%s_next_show_time' % table), table_name=table)
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
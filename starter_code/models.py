@@ -1,14 +1,35 @@
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
 
-db = SQLAlchemy()
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from replicas import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 
-class Venue(db.Model):
+class SoftDelete:
+    # set when the venue or artist is deleted; from then on every ORM
+    # query leaves the row out (see hide_deleted) until purge.py removes
+    # it and its shows
+    deleted_at = db.Column(db.DateTime)
+
+
+class Venue(SoftDelete, db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name',
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_city_state', 'city', 'state'),
+        # the purge's work list, only deleted rows are in it
+        db.Index('ix_venue_deleted_at', 'deleted_at',
+            postgresql_where=db.text('deleted_at IS NOT NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -23,16 +44,31 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # last write to the row or to anything shown on its page, drives the
+    # ETag / Last-Modified of the detail page
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+    # maintained by counters.py, exact while next_show_time is ahead
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    shows = db.relationship('Show', backref = 'venue', lazy = 'joined', cascade='all, delete')
+    # loads lazily, views choose an eager strategy through loading.PROFILES
+    shows = db.relationship('Show', backref = 'venue', lazy = 'select', cascade='all, delete')
     #show = db.relationship('Artist', secondary=Show, backref=db.backref('Venue', lazy="dynamic"))
     def __repr__(self):
       return f'Venue name: {self.name}, City: {self.city}'
 
 
-class Artist(db.Model):
+class Artist(SoftDelete, db.Model):
     __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name',
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_deleted_at', 'deleted_at',
+            postgresql_where=db.text('deleted_at IS NOT NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -46,20 +82,86 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # last write to the row or to anything shown on its page, drives the
+    # ETag / Last-Modified of the detail page
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+    # maintained by counters.py, exact while next_show_time is ahead
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    shows = db.relationship('Show', backref='artist', lazy = 'joined', cascade='all, delete')
+    # loads lazily, views choose an eager strategy through loading.PROFILES
+    shows = db.relationship('Show', backref='artist', lazy = 'select', cascade='all, delete')
     # show = db.relationship('Venue', secondary=Show, backref=db.backref('Artist', lazy="dynamic"))
     def __repr__(self):
       return f'Artist name: {self.name}, City: {self.city}'
 
 
+# shows booked without an end time
+DEFAULT_DURATION = timedelta(hours=2)
+
+
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + DEFAULT_DURATION
+
+
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime())
+    # a venue or artist has one show at a time: on Postgres the
+    # shows_*_no_overlap exclusion constraints (migration 4b8e1d7c3a62)
+    # enforce it, scheduling.py checks it before inserting
+    end_time = db.Column(db.DateTime(), nullable=False, default=default_end_time)
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
+    # shows are never edited, incremental exports pick up new ones by this
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
 
     def __repr__(self):
       return f'Show time: {self.start_time}, Artist ID: {self.artist_id}, Venue ID: {self.venue_id}'
+
+
+
+class Job(db.Model):
+    # side effects queued by the request handlers, run by jobs.py
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # the workers' poll for due jobs
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # keyword arguments of the handler
+    payload = db.Column(db.JSON, nullable=False)
+    # a job whose key is already in the table is not queued again
+    idempotency_key = db.Column(db.String(200), unique=True)
+    # queued, running, done or failed
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    # not before, later for retries
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # when a worker claimed it
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+@event.listens_for(Session, 'do_orm_execute')
+def hide_deleted(state):
+    # Soft-deleted venues and artists are left out of every ORM select:
+    # selected as entities or columns, in subqueries and in joins whose
+    # ON clause SQLAlchemy infers (an explicit ON clause is not reached,
+    # nor is a select of the bare table). Passing
+    # execution_options(include_deleted=True) returns them.
+    if state.is_select and not state.execution_options.get('include_deleted', False):
+        state.statement = state.statement.options(with_loader_criteria(
+            SoftDelete, lambda cls: cls.deleted_at.is_(None), include_aliases=True
+        ))
@@ -0,0 +1,204 @@
+import hashlib
+from datetime import datetime, timezone
+
+from flask import (
+    Response,
+    abort,
+    current_app,
+    flash,
+    g,
+    make_response,
+    render_template,
+    request
+  )
+
+from models import db, Venue, Artist, Show
+from queries import decode_cursor, page_of, show_page_query
+from counters import OWNERS, counters_current, show_counts_query
+from cache import cache
+from jobs import jobs
+from search import search_query, search_page
+from aio import reads
+
+#----------------------------------------------------------------------------#
+# Page helpers.
+#----------------------------------------------------------------------------#
+
+# Shared by the venue, artist and show blueprints: the request's clock,
+# show list cursors, conditional responses and the cache namespaces a
+# write invalidates.
+
+MODELS = {Venue.__tablename__: Venue, Artist.__tablename__: Artist}
+
+# the side whose pages list a venue (or artist)
+OTHER = {Venue: Artist, Artist: Venue}
+
+# rows touched per transaction by a linked_pages job
+LINKED_BATCH_SIZE = 1000
+
+
+def request_now():
+  # the past/upcoming cutoff is taken once per request so every query
+  # made while handling it agrees on which shows are upcoming
+  if 'now' not in g:
+    g.now = datetime.now()
+  return g.now
+
+def show_cursors():
+  # keyset cursors for the upcoming and past show lists on detail pages
+  try:
+    return tuple(
+      decode_cursor(request.args[name]) if request.args.get(name) else None
+      for name in ('upcoming_after', 'past_before')
+    )
+  except ValueError:
+    abort(400)
+
+def page_validators(model, owner_column, entity_id):
+  # (etag, last_modified) of a venue or artist page from one small
+  # query, before anything is loaded. The page changes when the entity
+  # is touched (updated_at) and when one of its shows moves from
+  # upcoming to past, so the later of the two is its last modification.
+  row = validators_query(model, owner_column, entity_id).first()
+  return validators_of(model, entity_id, row)
+
+def validators_query(model, owner_column, entity_id):
+  last_show = db.session.query(db.func.max(Show.start_time))\
+    .filter(owner_column == entity_id, Show.start_time <= request_now())\
+    .scalar_subquery()
+  return db.session.query(model.updated_at, last_show)\
+    .filter(model.id == entity_id)
+
+def validators_of(model, entity_id, row):
+  if row is None:
+    abort(404)
+  updated_at, last_show = row
+  last_modified = max(updated_at, last_show) if last_show else updated_at
+  # the show list cursors pick a different page of the same entity
+  etag = hashlib.md5('|'.join((
+    model.__tablename__,
+    str(entity_id),
+    last_modified.isoformat(),
+    request.args.get('upcoming_after', ''),
+    request.args.get('past_before', '')
+  )).encode()).hexdigest()
+  # stored as naive local time, HTTP dates are UTC with second precision
+  return etag, last_modified.astimezone(timezone.utc).replace(microsecond=0)
+
+def conditional_response(etag, last_modified, render):
+  # 304 when the client's copy is current, render() is only called
+  # for a full response
+  response = Response(status=304) if is_fresh(etag, last_modified) else make_response(render())
+  response.set_etag(etag)
+  response.last_modified = last_modified
+  # revalidate on every visit rather than guess a freshness lifetime
+  response.cache_control.no_cache = True
+  return response
+
+def is_fresh(etag, last_modified):
+  if request.if_none_match:
+    return request.if_none_match.contains(etag)
+  return request.if_modified_since is not None and request.if_modified_since >= last_modified
+
+def touch(model, ids):
+  # bumps updated_at of the given rows, for writes that change their
+  # pages without changing the rows themselves (shows, linked names)
+  model.query.filter(model.id.in_(ids))\
+    .update({'updated_at': datetime.now()}, synchronize_session=False)
+
+def columns(entity):
+  # the entity's column values as a plain dict, safe to cache
+  return {column.name: getattr(entity, column.name) for column in entity.__table__.columns}
+
+def venue_pages(venue_id):
+  # cache namespaces of the listings and the venue's own page
+  return ['venues', 'shows', 'venue:%d' % venue_id]
+
+def artist_pages(artist_id):
+  return ['artists', 'shows', 'artist:%d' % artist_id]
+
+def linked_ids(model, id):
+  # ids of the artists (or venues) with shows at this venue (or by this
+  # artist), whose pages list its name and shows
+  other = OTHER[model]
+  return [
+    other_id for other_id, in
+    db.session.query(OWNERS[other]).filter(OWNERS[model] == id).distinct()
+  ]
+
+def linked_pages(model, ids):
+  other = OTHER[model]
+  return ['%s:%d' % (other.__tablename__, other_id) for other_id in ids]
+
+@jobs.handler('linked_pages')
+def linked_pages_job(table, id):
+  # queued by the edits, which can change the name on thousands of
+  # pages: they are touched for a new ETag in batches and their cached
+  # data dropped. Deletes do this in the request, their pages must stop
+  # listing the shows at once.
+  model = MODELS[table]
+  other_ids = linked_ids(model, id)
+  for start in range(0, len(other_ids), LINKED_BATCH_SIZE):
+    touch(OTHER[model], other_ids[start:start + LINKED_BATCH_SIZE])
+    db.session.commit()
+  cache.invalidate(*linked_pages(model, other_ids))
+
+def parse_date(value):
+  # ISO date or datetime from a query string, None when absent
+  return datetime.fromisoformat(value) if value else None
+
+def stream_template(template_name, **context):
+  # like render_template, but yields the page in chunks as it renders
+  current_app.update_template_context(context)
+  template = current_app.jinja_env.get_template(template_name)
+  return template.generate(context)
+
+#  Async reads
+#  ----------------------------------------------------------------
+
+# for the async views that replace the read views with ASYNC_READS on
+# (see aio.py). They build the same statements and render the same
+# templates, the statements of a detail page run at the same time.
+
+async def page_validators_async(model, owner_column, entity_id):
+  rows, = await reads.run(validators_query(model, owner_column, entity_id))
+  return validators_of(model, entity_id, rows[0] if rows else None)
+
+async def entity_data_async(model, owner_column, other, entity_id, upcoming_after, past_before, page):
+  # the entity and both show pages at once, then its counts when the
+  # counters have fallen behind
+  now = request_now()
+  page_size = current_app.config['SHOWS_PAGE_SIZE']
+  entities, upcoming, past = await reads.run(
+    db.select(model.__table__).where(model.id == entity_id, model.deleted_at.is_(None)),
+    show_page_query(owner_column, entity_id, other, now, True, upcoming_after, page_size),
+    show_page_query(owner_column, entity_id, other, now, False, past_before, page_size)
+  )
+  if not entities:
+    abort(404)
+  entity = entities[0]
+  if counters_current(entity, now):
+    show_counts = entity.upcoming_shows_count, entity.past_shows_count
+  else:
+    (show_counts,), = await reads.run(show_counts_query(owner_column, entity_id, now))
+  return page(entity._asdict(), show_counts, *page_of(upcoming, page_size), *page_of(past, page_size))
+
+async def search_async(model, template, message):
+  search_term = request.form.get('search_term', '')
+  page = max(request.form.get('page', 1, type=int), 1)
+  page_size = current_app.config['SEARCH_PAGE_SIZE']
+  if search_term:
+    rows, = await reads.run(search_query(model, search_term, (page - 1) * page_size, page_size))
+    response, count = search_page(rows)
+  else:
+    count = ''
+    response = ''
+    flash(message)
+  return render_template(
+      template,
+      count=count,
+      results=response,
+      search_term=search_term,
+      page=page,
+      page_size=page_size
+    )
@@ -0,0 +1,149 @@
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+#----------------------------------------------------------------------------#
+# Connection pool.
+#----------------------------------------------------------------------------#
+
+# Engine options are built from the DB_* settings in config.py, which
+# read the environment. Under gunicorn every worker owns a pool, so
+# DB_POOL_SIZE + DB_MAX_OVERFLOW times the number of workers must stay
+# below the server's max_connections. Behind PgBouncer in transaction
+# mode (DB_PGBOUNCER) PgBouncer does the pooling and the app opens a
+# connection per checkout instead.
+
+
+class PoolStats:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.checkouts = 0
+    self.wait_seconds = 0.0
+    self.max_wait_seconds = 0.0
+    self.overflows = 0
+    self.timeouts = 0
+
+  def record_checkout(self, wait, overflow):
+    with self.lock:
+      self.checkouts += 1
+      self.wait_seconds += wait
+      self.max_wait_seconds = max(self.max_wait_seconds, wait)
+      if overflow:
+        self.overflows += 1
+
+  def record_timeout(self):
+    with self.lock:
+      self.timeouts += 1
+
+
+class MeteredPool:
+  # times how long each checkout waits for a connection, counts the
+  # checkouts that opened an overflow connection and pool timeouts
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.stats = PoolStats()
+
+  def _do_get(self):
+    start = time.perf_counter()
+    # QueuePool counts its connections in _overflow from -pool_size up,
+    # a checkout that opened one past pool_size left it above 0
+    before = self._overflow if isinstance(self, QueuePool) else None
+    try:
+      connection = super()._do_get()
+    except exc.TimeoutError:
+      self.stats.record_timeout()
+      raise
+    overflow = before is not None and self._overflow > max(before, 0)
+    self.stats.record_checkout(time.perf_counter() - start, overflow)
+    return connection
+
+
+class MeteredQueuePool(MeteredPool, QueuePool):
+  pass
+
+
+class MeteredNullPool(MeteredPool, NullPool):
+  pass
+
+
+def engine_options(config):
+  # SQLALCHEMY_ENGINE_OPTIONS for the configured database
+  if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # SQLite keeps SQLAlchemy's own pool choice
+    return {}
+
+  options = {}
+  if config['DB_PGBOUNCER']:
+    # PgBouncer refuses unknown startup parameters, so the statement
+    # timeout has to be set on the database role instead
+    options['poolclass'] = MeteredNullPool
+  else:
+    options.update(
+      poolclass=MeteredQueuePool,
+      pool_size=config['DB_POOL_SIZE'],
+      max_overflow=config['DB_MAX_OVERFLOW'],
+      pool_timeout=config['DB_POOL_TIMEOUT'],
+      pool_recycle=config['DB_POOL_RECYCLE'],
+      pool_pre_ping=config['DB_POOL_PRE_PING']
+    )
+    if config['DB_STATEMENT_TIMEOUT']:
+      options['connect_args'] = {
+        'options': '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT']
+      }
+  return options
+
+
+def async_engine_options(config):
+  # options for the asyncpg engine of the async read views (see aio.py),
+  # from the same DB_* settings. Async engines need their own pool
+  # class, so checkouts are not metered there.
+  if config['DB_PGBOUNCER']:
+    # asyncpg prepares every statement, which PgBouncer in transaction
+    # mode cannot route; its statement cache has to be off
+    return {
+      'poolclass': NullPool,
+      'connect_args': {'statement_cache_size': 0, 'prepared_statement_cache_size': 0},
+    }
+  # the views wait for a connection on the loop (see aio.py), so the
+  # same number of connections is kept open rather than some of them
+  # closed as overflow on every return and opened again
+  options = {
+    'pool_size': config['DB_POOL_SIZE'] + config['DB_MAX_OVERFLOW'],
+    'max_overflow': 0,
+    'pool_timeout': config['DB_POOL_TIMEOUT'],
+    'pool_recycle': config['DB_POOL_RECYCLE'],
+    'pool_pre_ping': config['DB_POOL_PRE_PING'],
+  }
+  if config['DB_STATEMENT_TIMEOUT']:
+    options['connect_args'] = {
+      'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}
+    }
+  return options
+
+
+def pool_stats(engine):
+  pool = engine.pool
+  stats = {
+    'pool': type(pool).__name__,
+    'status': pool.status(),
+  }
+  if isinstance(pool, QueuePool):
+    stats.update(
+      size=pool.size(),
+      checked_out=pool.checkedout(),
+      overflow=max(pool.overflow(), 0)
+    )
+  metered = getattr(pool, 'stats', None)
+  if metered is not None:
+    stats.update(
+      checkouts=metered.checkouts,
+      wait_seconds=metered.wait_seconds,
+      max_wait_seconds=metered.max_wait_seconds,
+      overflow_checkouts=metered.overflows,
+      timeouts=metered.timeouts
+    )
+  return stats
@@ -0,0 +1,91 @@
+import logging
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, Show
+from counters import OWNERS, refresh
+from cache import cache
+from jobs import jobs
+from pages import MODELS, OTHER, touch
+
+#----------------------------------------------------------------------------#
+# Purge.
+#----------------------------------------------------------------------------#
+
+# Deleting a venue or an artist only sets its deleted_at, which hides it
+# and its shows from every query at once. The rows are removed here,
+# by a 'purge' job the delete queues: the shows in batches of
+# PURGE_BATCH_SIZE, one short transaction each, then the counters of the
+# artists (or venues) that lost shows are recounted and the row itself
+# is deleted. A purge cut short is retried by the job queue; 'flask
+# purge' runs the pending ones by hand or from cron. Cut short between its last batch and the
+# recount, it leaves counters for 'flask check-counters --repair'.
+
+log = logging.getLogger('app.purge')
+
+
+def pending():
+  # (model, id) of every soft-deleted row, oldest first
+  deleted = []
+  for model in OWNERS:
+    deleted.extend(
+      (model, id) for id, in db.session.query(model.id)
+        .filter(model.deleted_at.isnot(None))
+        .order_by(model.deleted_at)
+        .execution_options(include_deleted=True)
+    )
+  return deleted
+
+
+def purge(model, entity_id, batch_size, report):
+  # deletes a soft-deleted row and its shows, calling report() with a
+  # progress line after every batch
+  owner_column = OWNERS[model]
+  other = OTHER[model]
+  name = '%s %d' % (model.__tablename__, entity_id)
+  other_ids = [id for id, in db.session.query(OWNERS[other]).filter(owner_column == entity_id).distinct()]
+  total = db.session.query(db.func.count(Show.id)).filter(owner_column == entity_id).scalar()
+
+  batch = db.select(Show.id).where(owner_column == entity_id).limit(batch_size)
+  deleted = 0
+  while True:
+    count = db.session.execute(Show.__table__.delete().where(Show.id.in_(batch))).rowcount
+    db.session.commit()
+    deleted += count
+    report('%s: %d of %d shows deleted' % (name, deleted, total))
+    if count < batch_size:
+      break
+
+  now = datetime.now()
+  for start in range(0, len(other_ids), batch_size):
+    ids = other_ids[start:start + batch_size]
+    refresh(other, ids, now)
+    touch(other, ids)
+    db.session.commit()
+  # their listing shows the upcoming counts
+  cache.invalidate(other.__tablename__ + 's', *('%s:%d' % (other.__tablename__, id) for id in other_ids))
+
+  db.session.execute(
+    model.__table__.delete().where(model.id == entity_id, model.deleted_at.isnot(None))
+  )
+  db.session.commit()
+  report('%s: purged, %d %ss recounted' % (name, len(other_ids), other.__tablename__))
+
+
+def purge_all(batch_size, report):
+  # purges every soft-deleted row, returns how many
+  deleted = pending()
+  for model, id in deleted:
+    purge(model, id, batch_size, report)
+  return len(deleted)
+
+
+@jobs.handler('purge')
+def purge_job(table, id):
+  # queued by the delete views, safe to repeat: a purged row is gone
+  # and a second run finds no shows
+  model = MODELS[table]
+  if model.query.filter(model.id == id, model.deleted_at.isnot(None))\
+      .execution_options(include_deleted=True).count():
+    purge(model, id, current_app.config['PURGE_BATCH_SIZE'], log.info)
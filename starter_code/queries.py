@@ -0,0 +1,131 @@
+from datetime import datetime
+from itertools import groupby
+
+from models import db, Venue, Artist, Show
+from counters import upcoming_count
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# rows fetched per round trip when streaming large listings
+YIELD_PER = 1000
+
+
+def venue_areas_query(now):
+  # one row per venue with its upcoming show count, read from the
+  # materialized counter (counted from the shows only where the counter
+  # has fallen behind)
+  return db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      upcoming_count(Venue, now).label('num_upcoming_shows')
+    ).order_by(Venue.state, Venue.city, Venue.name)
+
+
+def venue_areas(now):
+  return group_areas(venue_areas_query(now).yield_per(YIELD_PER))
+
+
+def group_areas(rows):
+  # rows arrive sorted by area so grouping is a single pass
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    yield {
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': row.id,
+        'name': row.name,
+        'num_upcoming_shows': row.num_upcoming_shows
+      } for row in venues]
+    }
+
+
+def encode_cursor(start_time, show_id):
+  return start_time.isoformat() + '_' + str(show_id)
+
+
+def decode_cursor(value):
+  # raises ValueError on anything that is not a cursor we handed out
+  start_time, _, show_id = value.partition('_')
+  return datetime.fromisoformat(start_time), int(show_id)
+
+
+def show_page(owner_column, owner_id, other, now, upcoming, cursor=None, page_size=20):
+  # One keyset page of a venue's or artist's shows joined to the other
+  # side (Artist for a venue, Venue for an artist). Upcoming shows run
+  # forwards from now, past shows backwards. Returns the rows and the
+  # cursor of the next page, or None on the last page.
+  query = show_page_query(owner_column, owner_id, other, now, upcoming, cursor, page_size)
+  return page_of(query.all(), page_size)
+
+
+def show_page_query(owner_column, owner_id, other, now, upcoming, cursor=None, page_size=20):
+  prefix = other.__tablename__
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      other.id.label(prefix + '_id'),
+      other.name.label(prefix + '_name'),
+      other.image_link.label(prefix + '_image_link')
+    ).join(other).filter(owner_column == owner_id)
+
+  key = db.tuple_(Show.start_time, Show.id)
+  if upcoming:
+    query = query.filter(Show.start_time > now)\
+      .order_by(Show.start_time, Show.id)
+    if cursor:
+      query = query.filter(key > cursor)
+  else:
+    query = query.filter(Show.start_time <= now)\
+      .order_by(Show.start_time.desc(), Show.id.desc())
+    if cursor:
+      query = query.filter(key < cursor)
+
+  # fetch one extra row to know whether another page follows
+  return query.limit(page_size + 1)
+
+
+def page_of(rows, page_size):
+  # (rows, next cursor) from the page_size + 1 rows of a keyset query
+  next_cursor = None
+  if len(rows) > page_size:
+    rows = rows[:page_size]
+    next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+  return rows, next_cursor
+
+
+def show_listing(start=None, end=None, city=None, genre=None, cursor=None):
+  # Shows joined to their artist and venue, oldest first, keyed on
+  # (start_time, id) so pages continue from a cursor. Each filter is
+  # served by an index: start_time by ix_shows_start_time_id, city by
+  # ix_venue_city_state and genre by the GIN index on artist.genres.
+  # The joins follow the foreign keys, which also leaves out the shows
+  # of deleted venues and artists (see models.hide_deleted).
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.end_time,
+      Show.artist_id,
+      Show.venue_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+      Venue.name.label('venue_name')
+    ).join(Artist)\
+    .join(Venue)\
+    .order_by(Show.start_time, Show.id)
+
+  if start:
+    query = query.filter(Show.start_time >= start)
+  if end:
+    query = query.filter(Show.start_time < end)
+  if city:
+    query = query.filter(Venue.city == city)
+  if genre:
+    # @> directly, the generic ARRAY type does not implement contains()
+    query = query.filter(Artist.genres.op('@>')([genre]))
+  if cursor:
+    query = query.filter(db.tuple_(Show.start_time, Show.id) > cursor)
+  return query
@@ -0,0 +1,154 @@
+import itertools
+import logging
+import threading
+import time
+
+from flask import g, has_app_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, exc, orm, text
+from sqlalchemy.sql.dml import UpdateBase
+
+from pool import pool_stats
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# With DATABASE_REPLICA_URLS set, GET and HEAD requests read from a
+# replica (binds 'replica0', 'replica1', ...), one per request, taken
+# round robin among the replicas passing their health checks. The
+# primary gets everything else: other methods, flushes and insert /
+# update / delete statements, the rest of a request once it has written,
+# and the CLI. A client that wrote gets a cookie that keeps its reads on
+# the primary for READ_YOUR_WRITES_SECONDS, so the page it is redirected
+# to shows its change even when the replicas are behind. Those requests
+# also skip the page data cache, which a replica may have refilled with
+# the old rows.
+
+log = logging.getLogger('app.replicas')
+
+PIN_COOKIE = 'fyyur_primary'
+
+# seconds behind the primary, 0 while the replica has replayed all it
+# received (the replay timestamp stops moving when the primary is idle)
+LAG_QUERY = text(
+  'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0'
+  ' ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+class RoutingSession(SignallingSession):
+
+  def get_bind(self, mapper=None, clause=None):
+    replica = g.get('db_replica') if has_app_context() else None
+    if self._flushing or isinstance(clause, UpdateBase):
+      if has_app_context():
+        # the rest of the request reads what it wrote
+        g.db_replica = replica = None
+        g.db_wrote = True
+    if replica is not None:
+      return replica
+    return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class Replicas:
+
+  def __init__(self):
+    self.names = []
+    self.engines = []
+    # the engines passing their last check, replaced as a whole
+    self.healthy = []
+    self.turn = itertools.count()
+    self.lock = threading.Lock()
+    self.thread = None
+    self.check_interval = 10
+    self.max_lag = 0
+    self.pin_seconds = 15
+
+  def init_app(self, app, db):
+    urls = [url.strip() for url in app.config['DATABASE_REPLICA_URLS'].split(',') if url.strip()]
+    self.names = ['replica%d' % i for i in range(len(urls))]
+    binds = dict(app.config['SQLALCHEMY_BINDS'] or {})
+    binds.update(zip(self.names, urls))
+    app.config['SQLALCHEMY_BINDS'] = binds
+    self.engines = [db.get_engine(app, bind=name) for name in self.names]
+    self.healthy = list(self.engines)
+    self.check_interval = app.config['REPLICA_CHECK_INTERVAL']
+    self.max_lag = app.config['REPLICA_MAX_LAG']
+    self.pin_seconds = app.config['READ_YOUR_WRITES_SECONDS']
+    for engine in self.engines:
+      event.listen(engine, 'handle_error', self.handle_error)
+
+  def start(self):
+    # checks run on a thread per worker, started by the first request
+    # (threads do not survive gunicorn's fork)
+    with self.lock:
+      if self.thread is None:
+        self.thread = threading.Thread(target=self.watch, name='replica-checks', daemon=True)
+        self.thread.start()
+
+  def watch(self):
+    while True:
+      self.check()
+      time.sleep(self.check_interval)
+
+  def check(self):
+    self.healthy = [engine for engine in self.engines if self.is_healthy(engine)]
+
+  def is_healthy(self, engine):
+    try:
+      with engine.connect() as connection:
+        if self.max_lag and engine.dialect.name == 'postgresql':
+          lag = connection.execute(LAG_QUERY).scalar()
+          if lag is not None and lag > self.max_lag:
+            log.warning('replica %r is %.0f s behind', engine.url, lag)
+            return False
+        else:
+          connection.execute(text('SELECT 1'))
+      return True
+    except exc.SQLAlchemyError as error:
+      log.warning('replica %r failed its check: %s', engine.url, error)
+      return False
+
+  def handle_error(self, context):
+    # a replica that dropped its connections is skipped until the next
+    # check passes, not just the connection
+    if context.is_disconnect and context.engine in self.healthy:
+      self.healthy = [engine for engine in self.healthy if engine is not context.engine]
+
+  def pick(self):
+    # None when no replica is healthy, the primary takes the reads
+    healthy = self.healthy
+    if not healthy:
+      return None
+    return healthy[next(self.turn) % len(healthy)]
+
+  def start_request(self):
+    g.db_replica = None
+    if not self.engines or request.method not in ('GET', 'HEAD'):
+      return
+    if request.cookies.get(PIN_COOKIE):
+      g.cache_refresh = True
+      return
+    self.start()
+    g.db_replica = self.pick()
+
+  def finish_request(self, response):
+    if self.engines and g.get('db_wrote'):
+      response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+    return response
+
+  def stats(self):
+    return {
+      name: dict(pool_stats(engine), healthy=engine in self.healthy)
+      for name, engine in zip(self.names, self.engines)
+    }
+
+
+replicas = Replicas()
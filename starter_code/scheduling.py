@@ -0,0 +1,120 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Scheduling.
+#----------------------------------------------------------------------------#
+
+# A venue or an artist plays one show at a time. The booked shows of one
+# venue never overlap, so ordered by start time their end times are in
+# order too, and a new slot can only collide with the last show starting
+# before it ends: one probe of ix_shows_venue_id_start_time (or the
+# artist one) per side. On Postgres the shows_*_no_overlap exclusion
+# constraints also reject two bookings racing for the same slot.
+
+# longest show accepted, bounds how far back a batch has to look
+MAX_DURATION = timedelta(hours=24)
+
+OWNERS = (('venue', Show.venue_id), ('artist', Show.artist_id))
+
+
+def describe(start, end):
+  return '%s to %s' % (start.strftime('%Y-%m-%d %H:%M'), end.strftime('%Y-%m-%d %H:%M'))
+
+
+def check_slot(start, end):
+  if end <= start:
+    return 'The show must end after it starts.'
+  if end - start > MAX_DURATION:
+    return 'Shows cannot last more than %d hours.' % (MAX_DURATION.total_seconds() // 3600)
+  return None
+
+
+def conflicting_show(owner_column, owner_id, start, end):
+  # the booked show of the venue or artist overlapping [start, end), or None
+  show = db.session.query(Show.id, Show.start_time, Show.end_time)\
+    .filter(owner_column == owner_id, Show.start_time < end)\
+    .order_by(Show.start_time.desc(), Show.end_time.desc())\
+    .first()
+  if show is not None and show.end_time > start:
+    return show
+  return None
+
+
+def check_booking(venue_id, artist_id, start, end):
+  # error messages for a new show, empty when the slot is free
+  error = check_slot(start, end)
+  if error:
+    return [error]
+  # the foreign keys would accept a deleted venue or artist
+  errors = [
+    'There is no %s %d.' % (name, owner_id)
+    for name, model, owner_id in (('venue', Venue, venue_id), ('artist', Artist, artist_id))
+    if db.session.query(model.id).filter(model.id == owner_id).first() is None
+  ]
+  if errors:
+    return errors
+  for (name, owner_column), owner_id in zip(OWNERS, (venue_id, artist_id)):
+    show = conflicting_show(owner_column, owner_id, start, end)
+    if show is not None:
+      errors.append('The %s is already booked from %s (show %d).' % (
+        name, describe(show.start_time, show.end_time), show.id
+      ))
+  return errors
+
+
+def check_tour(shows):
+  # {position: error messages} for a batch of new shows (dicts with
+  # venue_id, artist_id, start_time and end_time), checked against each
+  # other and against the booked shows, with one query per side
+  errors = defaultdict(list)
+  for position, show in enumerate(shows):
+    error = check_slot(show['start_time'], show['end_time'])
+    if error:
+      errors[position].append(error)
+
+  for name, owner_column in OWNERS:
+    key = name + '_id'
+    slots = defaultdict(list)
+    for position, show in enumerate(shows):
+      if position not in errors:
+        slots[show[key]].append((show['start_time'], show['end_time'], position))
+    if not slots:
+      continue
+    first = min(slot[0] for owned in slots.values() for slot in owned)
+    last = max(slot[1] for owned in slots.values() for slot in owned)
+    booked = db.session.query(owner_column, Show.start_time, Show.end_time, Show.id)\
+      .filter(
+        owner_column.in_(list(slots)),
+        Show.start_time < last,
+        Show.start_time > first - MAX_DURATION
+      )
+    for owner_id, start, end, id in booked:
+      slots[owner_id].append((start, end, None, id))
+
+    # each owner's new slots by start time. A slot is accepted when it
+    # overlaps no booked show and no slot accepted before it; those do
+    # not overlap each other, so only the last one accepted is compared
+    for owner_id, owned in slots.items():
+      taken = sorted((slot for slot in owned if slot[2] is None), key=lambda slot: slot[0])
+      starts = [slot[0] for slot in taken]
+      current = None
+      for slot in sorted((slot for slot in owned if slot[2] is not None), key=lambda slot: (slot[0], slot[1])):
+        # the booked show starting last before the slot ends
+        index = bisect_left(starts, slot[1]) - 1
+        if index >= 0 and taken[index][1] > slot[0]:
+          errors[slot[2]].append(overlap_message(name, taken[index]))
+        elif current is not None and slot[0] < current[1]:
+          errors[slot[2]].append(overlap_message(name, current))
+        else:
+          current = slot
+  return errors
+
+
+def overlap_message(name, slot):
+  if slot[2] is None:
+    return 'The %s is already booked from %s (show %d).' % (name, describe(slot[0], slot[1]), slot[3])
+  return 'The %s has another show in this batch from %s.' % (name, describe(slot[0], slot[1]))
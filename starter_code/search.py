@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# On Postgres, name searches are ILIKE matches served by the pg_trgm GIN
+# indexes on venue.name and artist.name, ranked by trigram similarity.
+# The page and the total come back from one statement through a window
+# count. Other databases (SQLite in local setups) have no trigram
+# support, so they search an in-process trigram inverted index instead.
+
+
+def escape_like(term):
+  # '/' as the escape character keeps clear of backslash quoting rules
+  return term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+
+def trigrams(text):
+  text = text.lower()
+  return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class InvertedIndex:
+  # trigram -> ids of the names containing it, rebuilt from the table
+  # whenever a row of the model has been written since the last build
+
+  def __init__(self, model):
+    self.model = model
+    self.stale = True
+    self.names = {}
+    self.postings = defaultdict(set)
+    for change in ('after_insert', 'after_update', 'after_delete'):
+      event.listen(model, change, self.invalidate)
+
+  def invalidate(self, mapper, connection, target):
+    self.stale = True
+
+  def build(self):
+    self.names = {}
+    self.postings = defaultdict(set)
+    for id, name in db.session.query(self.model.id, self.model.name):
+      name = name or ''
+      self.names[id] = name
+      for gram in trigrams(name):
+        self.postings[gram].add(id)
+    self.stale = False
+
+  def search(self, term):
+    if self.stale:
+      self.build()
+    term = term.lower()
+    grams = trigrams(term)
+    if grams:
+      candidates = set.intersection(*(self.postings.get(gram, set()) for gram in grams))
+    else:
+      # shorter than a trigram, every name is a candidate
+      candidates = self.names.keys()
+    return [id for id in candidates if term in self.names[id].lower()]
+
+
+indexes = {
+  Venue: InvertedIndex(Venue),
+  Artist: InvertedIndex(Artist),
+}
+
+
+def search(model, term, page=1, page_size=50):
+  # returns (rows, total) for one page of matches, rows carry id and name
+  offset = (page - 1) * page_size
+  if db.engine.dialect.name == 'postgresql':
+    return search_page(search_query(model, term, offset, page_size).all())
+
+  index = indexes[model]
+  ids = index.search(term)
+  names = index.names
+  # rank closer matches first: exact, prefix, then shorter names
+  ids.sort(key=lambda id: (
+    names[id].lower() != term.lower(),
+    not names[id].lower().startswith(term.lower()),
+    len(names[id]),
+    names[id],
+    id
+  ))
+  rows = [{'id': id, 'name': names[id]} for id in ids[offset:offset + page_size]]
+  return rows, len(ids)
+
+
+def search_query(model, term, offset, page_size):
+  # the Postgres search, ranked, with the total as a window count
+  return db.session.query(
+      model.id,
+      model.name,
+      db.func.count().over().label('total')
+    ).filter(model.name.ilike('%' + escape_like(term) + '%', escape='/'))\
+    .order_by(db.func.similarity(model.name, term).desc(), model.name, model.id)\
+    .limit(page_size).offset(offset)
+
+
+def search_page(rows):
+  # the window count is only visible on a row, an empty page past the
+  # end does not tell the total
+  total = rows[0].total if rows else 0
+  return [{'id': row.id, 'name': row.name} for row in rows], total
@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    flash,
+    render_template,
+    request,
+    stream_with_context
+  )
+
+from forms import ShowForm
+from models import db, Venue, Artist, Show
+from queries import YIELD_PER, show_listing, decode_cursor, page_of
+from cache import cache
+from counters import record_show
+from scheduling import check_booking
+from aio import reads
+from pages import request_now, touch, parse_date, stream_template
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+shows = Blueprint('shows', __name__, url_prefix='/shows')
+
+@shows.route('')
+def index():
+  shows, filters = show_filters(request.args)
+
+  if request.args.get('stream'):
+    # renders every matching show, flushing tiles as rows are fetched
+    rows = shows.yield_per(YIELD_PER)
+    return Response(stream_with_context(
+      stream_template('pages/shows.html', shows=rows, next_cursor=None, filters=filters)
+    ))
+
+  page_size = current_app.config['SHOWS_LISTING_PAGE_SIZE']
+  rows, next_cursor = cache.get_or_set(
+      'shows', request.query_string.decode(),
+      lambda: shows_page(shows.limit(page_size + 1).all())
+    )
+  return render_template('pages/shows.html', shows=rows, next_cursor=next_cursor, filters=filters)
+
+def show_filters(args):
+  # (show_listing query, filters for the template) from the optional
+  # filters in args: ?from=&to= (ISO dates), ?city=, ?genre=, and the
+  # ?after= cursor. The JSON API takes the same ones.
+  try:
+    start = parse_date(args.get('from'))
+    end = parse_date(args.get('to'))
+    cursor = decode_cursor(args['after']) if args.get('after') else None
+  except ValueError:
+    abort(400, 'from and to are ISO dates, after a cursor from a previous page')
+  city = args.get('city')
+  genre = args.get('genre')
+  filters = {
+    'from': args.get('from'),
+    'to': args.get('to'),
+    'city': city,
+    'genre': genre
+  }
+  return show_listing(start, end, city, genre, cursor), filters
+
+def shows_page(rows):
+  rows, next_cursor = page_of(rows, current_app.config['SHOWS_LISTING_PAGE_SIZE'])
+  return [row._asdict() for row in rows], next_cursor
+
+#  Create Show
+#  ----------------------------------------------------------------
+
+@shows.route('/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@shows.route('/create', methods=['POST'])
+def create_show_submission():
+  error = False
+  form = ShowForm()
+  if form.validate():
+    start_time = form.start_time.data
+    end_time = start_time + timedelta(minutes=form.duration.data)
+    try:
+      conflicts = check_booking(int(form.venue_id.data), int(form.artist_id.data), start_time, end_time)
+    except ValueError:
+      conflicts = ['Venue and artist IDs must be numbers.']
+    if conflicts:
+      # the slot is taken, back to the form to pick another one
+      for message in conflicts:
+        flash(message)
+      return render_template('forms/new_show.html', form=form)
+    try:
+        show = Show(start_time=start_time, end_time=end_time)
+        show.artist_id = request.form['artist_id']
+        show.venue_id = request.form['venue_id']
+
+        db.session.add(show)
+        touch(Venue, [show.venue_id])
+        touch(Artist, [show.artist_id])
+        record_show(show.venue_id, show.artist_id, form.start_time.data, request_now())
+        db.session.commit()
+        cache.invalidate(
+          'venues',
+          'shows',
+          'venue:%d' % int(request.form['venue_id']),
+          'artist:%d' % int(request.form['artist_id'])
+        )
+        flash('Show was successfully listed!')
+    except:
+      error = True
+      current_app.logger.exception('Show could not be created')
+      db.session.rollback()
+    finally:
+      db.session.close()
+    if error:
+      flash('An error occurred. Show could not be listed.')
+  return render_template('pages/home.html')
+
+#  Async reads
+#  ----------------------------------------------------------------
+
+async def index_async():
+  # ?stream=1 is left to the sync view, see asgi.py
+  shows, filters = show_filters(request.args)
+  page_size = current_app.config['SHOWS_LISTING_PAGE_SIZE']
+
+  async def compute():
+    rows, = await reads.run(shows.limit(page_size + 1))
+    return shows_page(rows)
+  rows, next_cursor = await cache.get_or_set_async('shows', request.query_string.decode(), compute)
+  return render_template('pages/shows.html', shows=rows, next_cursor=next_cursor, filters=filters)
+
+# endpoints served by the async views with ASYNC_READS on
+async_views = {
+  'shows.index': index_async,
+}
@@ -0,0 +1,102 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from bench.__main__ import use_sqlite_arrays
+from app import create_app
+from models import db, Venue, Artist, Show
+from jobs import jobs
+
+#----------------------------------------------------------------------------#
+# Fixtures.
+#----------------------------------------------------------------------------#
+
+# Every test gets an app of its own on a fresh SQLite file, built from
+# config.py with the settings it passes. Jobs run only when a test runs
+# a worker. The tests marked postgres run on TEST_DATABASE_URL, a
+# scratch database emptied and migrated for each of them.
+
+use_sqlite_arrays()
+
+# apart from each other, longer than a show (models.DEFAULT_DURATION)
+SLOT = timedelta(hours=3)
+
+# every artist plays Jazz and one of these
+GENRES = ['Folk', 'Blues', 'Soul', 'Funk', 'Swing']
+
+
+def make_config(**settings):
+  values = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+  values.update(settings)
+  return type('TestConfig', (), values)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+  def make(**settings):
+    settings.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///%s' % (tmp_path / 'fyyur.db'))
+    settings.setdefault('JOBS_IN_PROCESS', False)
+    settings.setdefault('WTF_CSRF_ENABLED', False)
+    app = create_app(make_config(**settings), migrations=False)
+    with app.app_context():
+      db.create_all()
+    return app
+  yield make
+  jobs.worker = None
+
+
+@pytest.fixture
+def app(make_app):
+  return make_app()
+
+
+@pytest.fixture
+def postgres_app():
+  from flask_migrate import upgrade
+  url = os.environ.get('TEST_DATABASE_URL')
+  if not url:
+    pytest.skip('TEST_DATABASE_URL is not set')
+  app = create_app(make_config(SQLALCHEMY_DATABASE_URI=url, JOBS_IN_PROCESS=False))
+  with app.app_context():
+    db.session.execute(db.text('DROP SCHEMA public CASCADE'))
+    db.session.execute(db.text('CREATE SCHEMA public'))
+    db.session.commit()
+    upgrade(directory=os.path.join(config.basedir, 'migrations'))
+  yield app
+  jobs.worker = None
+
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+
+def seed(venues=3, artists=3):
+  # every artist plays every venue, once from two days ago backwards and
+  # once from two days ahead onwards. Each pair gets its own slot, no
+  # venue or artist is double-booked (shows_*_no_overlap on Postgres).
+  now = datetime.now()
+  venue_rows = [
+    Venue(name='Venue %d' % i, city=['Austin', 'Dallas'][i % 2], state='TX', genres=['Jazz'])
+    for i in range(venues)
+  ]
+  artist_rows = [
+    Artist(name='Artist %d' % i, city='Austin', state='TX', genres=['Jazz', GENRES[i % len(GENRES)]])
+    for i in range(artists)
+  ]
+  db.session.add_all(venue_rows + artist_rows)
+  db.session.flush()
+  for venue_index, venue in enumerate(venue_rows):
+    for artist_index, artist in enumerate(artist_rows):
+      slot = SLOT * (venue_index * artists + artist_index)
+      for start_time in (now - timedelta(days=2) - slot, now + timedelta(days=2) + slot):
+        db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time))
+  db.session.commit()
+
+
+@pytest.fixture
+def catalogue(app):
+  with app.app_context():
+    seed()
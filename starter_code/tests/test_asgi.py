@@ -0,0 +1,130 @@
+import asyncio
+import os
+from urllib.parse import urlencode
+
+import pytest
+
+from app import create_app
+from aio import reads
+from asgi import ASGIApp
+from models import Venue
+from conftest import make_config, seed
+
+#----------------------------------------------------------------------------#
+# The ASGI entry point: sync views on its threads, and with ASYNC_READS
+# the read views on the event loop, through asyncpg.
+#----------------------------------------------------------------------------#
+
+VENUE_FORM = {
+  'name': 'Hall', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+  'phone': '555-0100', 'genres': ['Jazz'], 'image_link': '',
+  'facebook_link': 'https://www.facebook.com/hall', 'website_link': '', 'seeking_description': '',
+}
+
+
+async def call(server, method, path, form=None, headers=()):
+  # (status, headers, body) of one request
+  path, _, query = path.partition('?')
+  body = urlencode(form, doseq=True).encode() if form is not None else b''
+  headers = [(name.lower().encode(), value.encode()) for name, value in headers]
+  if form is not None:
+    headers.append((b'content-type', b'application/x-www-form-urlencoded'))
+    headers.append((b'content-length', str(len(body)).encode()))
+  scope = {
+    'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+    'path': path, 'query_string': query.encode(), 'root_path': '',
+    'headers': headers, 'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+  }
+  messages = [{'type': 'http.request', 'body': body}]
+  sent = []
+
+  async def receive():
+    return messages.pop(0)
+
+  async def send(message):
+    sent.append(message)
+
+  await server(scope, receive, send)
+  start = sent[0]
+  response_headers = {name.decode(): value.decode() for name, value in start['headers']}
+  return start['status'], response_headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_sync_views(make_app, catalogue):
+  app = make_app(CACHE_BACKEND='null')
+  server = ASGIApp(app)
+
+  async def requests():
+    return await asyncio.gather(
+      call(server, 'GET', '/venues'),
+      call(server, 'POST', '/venues/create', VENUE_FORM),
+    )
+  (status, _, body), (created, _, page) = asyncio.run(requests())
+  assert status == 200
+  assert b'Venue 0' in body
+  assert created == 200
+  assert b'successfully listed' in page
+  with app.app_context():
+    assert Venue.query.filter_by(name='Hall').count() == 1
+
+
+@pytest.mark.postgres
+def test_async_views_match_sync_views(postgres_app):
+  with postgres_app.app_context():
+    seed()
+  app = create_app(make_config(
+    SQLALCHEMY_DATABASE_URI=os.environ['TEST_DATABASE_URL'],
+    JOBS_IN_PROCESS=False,
+    CACHE_BACKEND='null',
+    ASYNC_READS=True
+  ), migrations=False)
+  server = ASGIApp(app)
+  client = app.test_client()
+  pages = [
+    ('GET', '/venues', None),
+    ('GET', '/venues/1', None),
+    ('GET', '/venues/999', None),
+    ('GET', '/artists', None),
+    ('GET', '/artists/2?past_before=', None),
+    ('GET', '/shows', None),
+    ('GET', '/shows?city=Austin&genre=Folk', None),
+    # on the sync view
+    ('GET', '/shows?stream=1', None),
+    ('POST', '/venues/search', {'search_term': 'venue'}),
+    ('POST', '/artists/search', {'search_term': 'artist 1'}),
+  ]
+
+  async def requests():
+    try:
+      responses = await asyncio.gather(*(call(server, method, path, form) for method, path, form in pages))
+      # the async engine served them
+      assert reads.engine is not None
+      return responses
+    finally:
+      await reads.stop()
+  for (method, path, form), (status, headers, body) in zip(pages, asyncio.run(requests())):
+    expected = client.open(path, method=method, data=form)
+    assert (status, body) == (expected.status_code, expected.data), path
+    assert headers.get('etag') == expected.headers.get('ETag')
+
+
+@pytest.mark.postgres
+def test_async_conditional_get(postgres_app):
+  with postgres_app.app_context():
+    seed()
+  app = create_app(make_config(
+    SQLALCHEMY_DATABASE_URI=os.environ['TEST_DATABASE_URL'],
+    JOBS_IN_PROCESS=False,
+    ASYNC_READS=True
+  ), migrations=False)
+  server = ASGIApp(app)
+
+  async def requests():
+    try:
+      _, headers, _ = await call(server, 'GET', '/artists/1')
+      return await call(server, 'GET', '/artists/1', headers=[('If-None-Match', headers['etag'])])
+    finally:
+      await reads.stop()
+  status, _, body = asyncio.run(requests())
+  assert status == 304
+  assert body == b''
@@ -0,0 +1,124 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Show
+from jobs import Worker
+
+#----------------------------------------------------------------------------#
+# Conditional GETs of the venue and artist pages.
+#----------------------------------------------------------------------------#
+
+VENUE_FORM = {
+  'name': 'Renamed Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+  'phone': '555-0100', 'genres': ['Jazz'], 'image_link': '', 'facebook_link': '',
+  'website_link': '', 'seeking_description': '',
+}
+
+ARTIST_FORM = {
+  'name': 'Renamed Artist', 'city': 'Austin', 'state': 'TX', 'phone': '555-0100',
+  'genres': ['Jazz'], 'image_link': '', 'facebook_link': '', 'website_link': '',
+  'seeking_description': '',
+}
+
+
+@pytest.fixture
+def app(make_app):
+  # one process, the page data cache must follow the writes
+  return make_app(CACHE_BACKEND='lru')
+
+
+@pytest.fixture
+def page(client, catalogue):
+  # the first, full response of /venues/1
+  response = client.get('/venues/1')
+  assert response.status_code == 200
+  return response
+
+
+def revalidate(client, path, page):
+  return client.get(path, headers={'If-None-Match': page.headers['ETag']})
+
+
+def test_full_response_has_validators(page):
+  assert page.headers['ETag']
+  assert page.headers['Last-Modified']
+  assert page.headers['Cache-Control'] == 'no-cache'
+
+
+def test_if_none_match(client, page):
+  response = revalidate(client, '/venues/1', page)
+  assert response.status_code == 304
+  assert response.data == b''
+  assert response.headers['ETag'] == page.headers['ETag']
+  assert client.get('/venues/1', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_if_modified_since(client, page):
+  last_modified = page.headers['Last-Modified']
+  assert client.get('/venues/1', headers={'If-Modified-Since': last_modified}).status_code == 304
+  earlier = 'Mon, 01 Jan 2001 00:00:00 GMT'
+  assert client.get('/venues/1', headers={'If-Modified-Since': earlier}).status_code == 200
+
+
+def test_other_show_page_is_another_variant(client, page):
+  response = revalidate(client, '/venues/1?past_before=2030-01-01T00:00:00_99', page)
+  assert response.status_code == 200
+
+
+def test_missing_entity(client, catalogue):
+  assert client.get('/venues/99').status_code == 404
+  assert client.get('/artists/99').status_code == 404
+
+
+def test_edit_changes_the_page(client, page):
+  assert client.post('/venues/1/edit', data=VENUE_FORM).status_code == 302
+  response = revalidate(client, '/venues/1', page)
+  assert response.status_code == 200
+  assert response.headers['ETag'] != page.headers['ETag']
+  assert 'Renamed Venue' in response.data.decode()
+
+
+def test_linked_edit_changes_the_page_once_its_job_ran(app, client, page):
+  # the venue page lists the artist's name, the edit queues its touch
+  assert client.post('/artists/1/edit', data=ARTIST_FORM).status_code == 302
+  Worker(app, 1).run(burst=True)
+  response = revalidate(client, '/venues/1', page)
+  assert response.status_code == 200
+  assert 'Renamed Artist' in response.data.decode()
+
+
+def test_linked_delete_changes_the_page_at_once(client, catalogue):
+  page = client.get('/artists/1')
+  assert 'Venue 0' in page.data.decode()
+  assert client.delete('/venues/1').status_code == 204
+  # no worker has run
+  response = revalidate(client, '/artists/1', page)
+  assert response.status_code == 200
+  assert 'Venue 0' not in response.data.decode()
+
+
+def test_new_show_changes_the_page(client, page):
+  start_time = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+  response = client.post('/shows/create', data={
+    'venue_id': 1, 'artist_id': 2, 'start_time': start_time, 'duration': 60,
+  })
+  assert response.status_code == 200
+  response = revalidate(client, '/venues/1', page)
+  assert response.status_code == 200
+  assert response.data.decode().count('Artist 1') > page.data.decode().count('Artist 1')
+
+
+def test_show_moving_to_past_changes_the_page(app, client, catalogue):
+  # nothing is written when a show starts, its start_time becomes the
+  # page's last modification
+  with app.app_context():
+    db.session.add(Show(venue_id=1, artist_id=3, start_time=datetime.now() + timedelta(seconds=1)))
+    db.session.commit()
+  page = client.get('/venues/1')
+  assert revalidate(client, '/venues/1', page).status_code == 304
+  time.sleep(1.1)
+  response = revalidate(client, '/venues/1', page)
+  assert response.status_code == 200
+  assert response.headers['ETag'] != page.headers['ETag']
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+from queries import show_page_query, show_listing
+from search import search_query
+from conftest import seed
+
+#----------------------------------------------------------------------------#
+# Index use of the hot queries, from their EXPLAIN on Postgres. Sequential
+# scans are disabled, so a plan without the index means the query cannot
+# use it at all (a cast, a function on the column, a wrong operator).
+#----------------------------------------------------------------------------#
+
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def app(postgres_app):
+  with postgres_app.app_context():
+    seed(venues=20, artists=20)
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+  return postgres_app
+
+
+def plan(query, disable=('seqscan',)):
+  # the EXPLAIN output of an ORM query, one string
+  statement = query.statement.compile(dialect=db.engine.dialect)
+  connection = db.session.connection()
+  for method in disable:
+    connection.exec_driver_sql('SET LOCAL enable_%s = off' % method)
+  rows = connection.exec_driver_sql('EXPLAIN ' + str(statement), statement.params)
+  return '\n'.join(row for row, in rows)
+
+
+@pytest.mark.parametrize('owner_column, other, index', [
+  (Show.venue_id, Artist, 'ix_shows_venue_id_start_time'),
+  (Show.artist_id, Venue, 'ix_shows_artist_id_start_time'),
+])
+@pytest.mark.parametrize('upcoming', [True, False])
+def test_detail_page_shows(app, owner_column, other, index, upcoming):
+  with app.app_context():
+    assert index in plan(show_page_query(owner_column, 1, other, datetime.now(), upcoming, page_size=10))
+
+
+@pytest.mark.parametrize('filters, index', [
+  ({}, 'ix_shows_start_time_id'),
+  ({'city': 'Austin'}, 'ix_venue_city_state'),
+])
+def test_show_listing(app, filters, index):
+  with app.app_context():
+    assert index in plan(show_listing(**filters))
+
+
+def test_show_listing_genre(app):
+  # the seeded artist table is a single page, walking it through its
+  # primary key beats the GIN index on cost. Without plain index scans
+  # the only way left to filter on genre is a bitmap scan of the GIN.
+  with app.app_context():
+    assert 'ix_artist_genres' in plan(show_listing(genre='Folk'), disable=('seqscan', 'indexscan'))
+
+
+@pytest.mark.parametrize('model, index', [
+  (Venue, 'ix_venue_name_trgm'),
+  (Artist, 'ix_artist_name_trgm'),
+])
+def test_search(app, model, index):
+  with app.app_context():
+    assert index in plan(search_query(model, 'enu', 0, 50))
@@ -0,0 +1,185 @@
+import signal
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Venue, Show, Job
+from jobs import jobs, Worker
+
+#----------------------------------------------------------------------------#
+# Background jobs, run by a worker in burst mode.
+#----------------------------------------------------------------------------#
+
+calls = []
+
+
+@jobs.handler('test_record')
+def record(value):
+  calls.append(value)
+
+
+@jobs.handler('test_fail', max_attempts=3)
+def fail():
+  raise ValueError('always fails')
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+  calls.clear()
+
+
+def run_worker(app, threads=2):
+  worker = Worker(app, threads)
+  worker.run(burst=True)
+  return worker
+
+
+def enqueue(app, kind, payload, **options):
+  with app.app_context():
+    jobs.enqueue(kind, payload, **options)
+    db.session.commit()
+
+
+def job_rows(app):
+  with app.app_context():
+    return [
+      (job.kind, job.status, job.attempts)
+      for job in Job.query.order_by(Job.id)
+    ]
+
+
+def test_enqueued_job_runs(app):
+  enqueue(app, 'test_record', {'value': 1})
+  enqueue(app, 'test_record', {'value': 2})
+  assert job_rows(app) == [('test_record', 'queued', 0)] * 2
+
+  worker = run_worker(app)
+  assert sorted(calls) == [1, 2]
+  assert worker.done == 2
+  with app.app_context():
+    job = Job.query.first()
+    assert (job.status, job.attempts) == ('done', 1)
+    assert job.finished_at is not None
+
+
+def test_delayed_job_waits(app):
+  enqueue(app, 'test_record', {'value': 1}, delay=60)
+  run_worker(app)
+  assert calls == []
+  assert job_rows(app) == [('test_record', 'queued', 0)]
+
+
+def test_failing_job_backs_off_then_fails(make_app):
+  app = make_app(JOB_RETRY_DELAY=10)
+  enqueue(app, 'test_fail', {})
+
+  # each burst makes one attempt, the retry is not due yet
+  for attempts, delay in ((1, 10), (2, 20)):
+    started = datetime.now()
+    run_worker(app)
+    with app.app_context():
+      job = Job.query.one()
+      assert (job.status, job.attempts) == ('queued', attempts)
+      assert 'ValueError: always fails' in job.last_error
+      assert started + timedelta(seconds=delay) <= job.run_at <= datetime.now() + timedelta(seconds=delay)
+      job.run_at = datetime.now()
+      db.session.commit()
+
+  worker = run_worker(app)
+  assert worker.failed == 1
+  assert job_rows(app) == [('test_fail', 'failed', 3)]
+
+
+def test_unknown_kind_fails(app):
+  with app.app_context():
+    db.session.add(Job(kind='test_missing', payload={}, max_attempts=1, run_at=datetime.now()))
+    db.session.commit()
+  run_worker(app)
+  with app.app_context():
+    job = Job.query.one()
+    assert job.status == 'failed'
+    assert 'No handler for test_missing jobs' in job.last_error
+
+
+def test_duplicate_key_is_dropped(app):
+  enqueue(app, 'test_record', {'value': 1}, key='once')
+  enqueue(app, 'test_record', {'value': 2}, key='once')
+  run_worker(app)
+  # a key stays taken while its job is kept
+  enqueue(app, 'test_record', {'value': 3}, key='once')
+  run_worker(app)
+  assert calls == [1]
+  assert job_rows(app) == [('test_record', 'done', 1)]
+
+
+def test_stale_running_job_is_taken_over(make_app):
+  app = make_app(JOB_TIMEOUT=600)
+  now = datetime.now()
+  with app.app_context():
+    for value, locked_at in ((1, now - timedelta(seconds=601)), (2, now - timedelta(seconds=60))):
+      db.session.add(Job(
+        kind='test_record', payload={'value': value}, status='running', attempts=1,
+        max_attempts=5, run_at=now - timedelta(hours=1), locked_at=locked_at
+      ))
+    db.session.commit()
+
+  run_worker(app)
+  # the worker of the second one may still be running it
+  assert calls == [1]
+  assert job_rows(app) == [('test_record', 'done', 2), ('test_record', 'running', 1)]
+
+
+def test_done_jobs_are_cleaned_after_retention(make_app):
+  app = make_app(JOB_RETENTION_DAYS=7)
+  now = datetime.now()
+  with app.app_context():
+    for status, days in (('done', 8), ('done', 1), ('failed', 8)):
+      db.session.add(Job(
+        kind='test_record', payload={}, status=status, attempts=1, max_attempts=5,
+        run_at=now - timedelta(days=days), finished_at=now - timedelta(days=days),
+        idempotency_key='%s-%d' % (status, days)
+      ))
+    db.session.commit()
+
+  run_worker(app)
+  with app.app_context():
+    assert sorted(key for key, in db.session.query(Job.idempotency_key)) == ['done-1', 'failed-8']
+  # the key of the cleaned job can be used again
+  enqueue(app, 'test_record', {'value': 1}, key='done-8')
+  run_worker(app)
+  assert calls == [1]
+
+
+def test_claimed_jobs_are_released_at_shutdown(app):
+  enqueue(app, 'test_record', {'value': 1})
+  worker = Worker(app, 2)
+  worker.pool.shutdown()
+  worker.run()
+  assert calls == []
+  with app.app_context():
+    job = Job.query.one()
+    assert (job.status, job.attempts, job.locked_at) == ('queued', 0, None)
+
+
+def test_delete_purges_through_a_job(app, client, catalogue):
+  assert client.delete('/venues/1').status_code == 204
+  with app.app_context():
+    assert Show.query.filter_by(venue_id=1).count() == 2 * 3
+  assert job_rows(app) == [('purge', 'queued', 0)]
+
+  run_worker(app)
+  assert job_rows(app) == [('purge', 'done', 1)]
+  with app.app_context():
+    assert Show.query.filter_by(venue_id=1).count() == 0
+    assert db.session.query(Venue.id).execution_options(include_deleted=True).count() == 2
+
+
+def test_worker_command(app, monkeypatch):
+  # its ^C handler would outlive the command
+  monkeypatch.setattr(signal, 'signal', lambda *args: None)
+  enqueue(app, 'test_record', {'value': 1})
+  enqueue(app, 'test_fail', {})
+  result = app.test_cli_runner().invoke(args=['worker', '--burst'])
+  assert result.exit_code == 0
+  assert result.output == '1 done, 0 failed\n'
+  assert calls == [1]
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from pool import MeteredQueuePool, pool_stats
+
+#----------------------------------------------------------------------------#
+# Pool metering under saturation, a SQLite file standing in for Postgres.
+#----------------------------------------------------------------------------#
+
+
+@pytest.fixture
+def engine(tmp_path):
+  engine = create_engine(
+    'sqlite:///%s' % (tmp_path / 'pool.db'),
+    poolclass=MeteredQueuePool,
+    pool_size=2,
+    max_overflow=1,
+    pool_timeout=0.2,
+    # the connections are shared by the client threads
+    connect_args={'check_same_thread': False},
+  )
+  yield engine
+  engine.dispose()
+
+
+def test_overflow_and_timeout(engine):
+  held = [engine.connect() for _ in range(2)]
+  assert pool_stats(engine)['overflow_checkouts'] == 0
+  held.append(engine.connect())
+  assert pool_stats(engine)['overflow_checkouts'] == 1
+
+  start = time.perf_counter()
+  with pytest.raises(exc.TimeoutError):
+    engine.connect()
+  assert time.perf_counter() - start >= 0.2
+  stats = pool_stats(engine)
+  assert stats['timeouts'] == 1
+  assert (stats['checked_out'], stats['overflow']) == (3, 1)
+
+  # a pooled connection handed out while the overflow one is still out
+  # opens nothing
+  held.pop(0).close()
+  held.append(engine.connect())
+  stats = pool_stats(engine)
+  assert (stats['checkouts'], stats['overflow_checkouts']) == (4, 1)
+  for connection in held:
+    connection.close()
+
+
+def test_saturated_pool_queues_checkouts(engine):
+  # eight clients on three connections, each holding one for 50 ms
+  engine.pool._timeout = 5
+  peak = []
+  def client():
+    with engine.connect() as connection:
+      connection.execute(text('SELECT 1'))
+      peak.append(engine.pool.checkedout())
+      time.sleep(0.05)
+  threads = [threading.Thread(target=client) for _ in range(8)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+  stats = pool_stats(engine)
+  assert stats['checkouts'] == 8
+  assert stats['timeouts'] == 0
+  assert max(peak) == 3
+  # at least one client waited for a connection to come back
+  assert stats['max_wait_seconds'] >= 0.04
+  assert 1 <= stats['overflow_checkouts'] <= 8 - 2
@@ -0,0 +1,100 @@
+import shutil
+import sqlite3
+
+import pytest
+from flask import g
+
+from models import db, Venue
+from replicas import replicas, PIN_COOKIE
+
+#----------------------------------------------------------------------------#
+# Read replicas, two SQLite files: the replica is a copy of the primary
+# whose venue has another name, so every page tells which one it read.
+#----------------------------------------------------------------------------#
+
+VENUE_FORM = {
+  'name': 'Hall 2', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+  'phone': '555-0100', 'genres': ['Jazz'], 'image_link': '', 'facebook_link': '',
+  'website_link': '', 'seeking_description': '',
+}
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+  primary = make_app(CACHE_BACKEND='null')
+  with primary.app_context():
+    db.session.add(Venue(name='Hall', city='Austin', state='TX', genres=['Jazz']))
+    db.session.commit()
+  replica = tmp_path / 'replica.db'
+  shutil.copy(tmp_path / 'fyyur.db', replica)
+  rename(replica, 'Hall (replica)')
+  app = make_app(CACHE_BACKEND='null', DATABASE_REPLICA_URLS='sqlite:///%s' % replica)
+  # the checks run when a test asks for them
+  replicas.thread = 'off'
+  yield app
+  replicas.thread = None
+
+
+def rename(path, name):
+  connection = sqlite3.connect(str(path))
+  connection.execute('UPDATE venue SET name = ?', (name,))
+  connection.commit()
+  connection.close()
+
+
+def venue_name(path):
+  connection = sqlite3.connect(str(path))
+  name, = connection.execute('SELECT name FROM venue').fetchone()
+  connection.close()
+  return name
+
+
+def test_get_reads_the_replica(client):
+  assert 'Hall (replica)' in client.get('/venues/1').data.decode()
+  assert client.get('/api/v1/venues/1').json['data']['name'] == 'Hall (replica)'
+
+
+def test_write_goes_to_the_primary_and_pins_the_client(app, client, tmp_path):
+  response = client.post('/venues/1/edit', data=VENUE_FORM)
+  assert response.status_code == 302
+  assert PIN_COOKIE in response.headers['Set-Cookie']
+  assert venue_name(tmp_path / 'fyyur.db') == 'Hall 2'
+  assert venue_name(tmp_path / 'replica.db') == 'Hall (replica)'
+
+  # the cookie keeps this client's reads on the primary
+  assert 'Hall 2' in client.get('/venues/1').data.decode()
+  assert 'Hall (replica)' in app.test_client().get('/venues/1').data.decode()
+
+
+def test_flush_moves_the_request_to_the_primary(app):
+  with app.test_request_context('/venues/1'):
+    app.preprocess_request()
+    assert db.session.query(Venue.name).filter(Venue.id == 1).scalar() == 'Hall (replica)'
+    db.session.add(Venue(name='New', city='Austin', state='TX', genres=['Jazz']))
+    db.session.flush()
+    assert g.db_replica is None
+    # the rest of the request reads what it wrote
+    assert db.session.query(Venue.name).filter(Venue.id == 1).scalar() == 'Hall'
+    assert db.session.query(Venue).count() == 2
+    db.session.rollback()
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(client, tmp_path):
+  replicas.check()
+  assert len(replicas.healthy) == 1
+  replica = tmp_path / 'replica.db'
+  replica.rename(tmp_path / 'replica.gone')
+  # SQLite cannot open a directory
+  replica.mkdir()
+  replicas.check()
+  assert replicas.healthy == []
+  response = client.get('/venues/1')
+  assert response.status_code == 200
+  assert 'Hall (replica)' not in response.data.decode()
+  assert 'Hall' in response.data.decode()
+  assert client.get('/pool/stats').json['replicas']['replica0']['healthy'] is False
+
+  replica.rmdir()
+  (tmp_path / 'replica.gone').rename(replica)
+  replicas.check()
+  assert 'Hall (replica)' in client.get('/venues/1').data.decode()
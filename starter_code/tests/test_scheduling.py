@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from models import db, Venue, Artist, Show
+from scheduling import check_tour
+
+#----------------------------------------------------------------------------#
+# Batches of new shows checked against each other and the booked shows.
+#----------------------------------------------------------------------------#
+
+DAY = datetime(2030, 1, 1)
+
+
+def at(hour):
+  return DAY + timedelta(hours=hour)
+
+
+def tour(*hours):
+  return [
+    {'venue_id': 1, 'artist_id': artist_id, 'start_time': at(start), 'end_time': at(end)}
+    for artist_id, (start, end) in enumerate(hours, 1)
+  ]
+
+
+def book(app, start, end, artist_id=4):
+  with app.app_context():
+    db.session.add(Venue(name='Hall', city='Austin', state='TX', genres=['Jazz']))
+    db.session.add_all(
+      Artist(name='Artist %d' % number, city='Austin', state='TX', genres=['Jazz']) for number in range(4)
+    )
+    db.session.add(Show(venue_id=1, artist_id=artist_id, start_time=at(start), end_time=at(end)))
+    db.session.commit()
+
+
+def test_free_slots(app):
+  book(app, 20, 22)
+  with app.app_context():
+    assert check_tour(tour((10, 12), (12, 14), (14, 16))) == {}
+
+
+def test_overlapping_new_slot(app):
+  book(app, 20, 22)
+  with app.app_context():
+    errors = check_tour(tour((10, 12), (11, 13), (12, 14)))
+  assert list(errors) == [1]
+  assert 'another show in this batch' in errors[1][0]
+
+
+def test_rejected_slot_does_not_block_the_next(app):
+  # the middle slot overlaps the booked show, the last one only overlaps
+  # the middle one and is accepted
+  book(app, 15, 16)
+  with app.app_context():
+    errors = check_tour(tour((10, 12), (13, 18), (17, 19)))
+  assert list(errors) == [1]
+  assert 'already booked' in errors[1][0]
+
+
+def test_booked_show_starting_inside_a_slot(app):
+  book(app, 11, 13)
+  with app.app_context():
+    errors = check_tour(tour((10, 12), (13, 14)))
+  assert list(errors) == [0]
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import event
+
+from models import db
+from browse import facets_cache
+from conftest import seed
+
+#----------------------------------------------------------------------------#
+# Statements per page. A page's count must not grow with the rows it
+# lists: an N+1 shows up as a count that differs between a small and a
+# larger catalogue.
+#----------------------------------------------------------------------------#
+
+# path: statements the page may run, the cache being off
+PAGES = {
+  '/venues': 1,
+  '/artists': 1,
+  '/shows': 1,
+  '/shows?city=Austin': 1,
+  # validators, the row, its upcoming and past shows
+  '/venues/1': 4,
+  '/artists/1': 4,
+  '/venues/1/edit': 1,
+  '/artists/1/edit': 1,
+  '/api/v1/venues': 1,
+  '/api/v1/venues/1': 2,
+  '/api/v1/artists': 1,
+  '/api/v1/shows': 1,
+}
+
+
+@pytest.fixture
+def app(make_app):
+  return make_app(CACHE_BACKEND='null')
+
+
+def count_statements(app, client, path):
+  statements = []
+  def before_cursor_execute(conn, cursor, statement, *args):
+    statements.append(statement)
+  event.listen(db.get_engine(app), 'before_cursor_execute', before_cursor_execute)
+  try:
+    response = client.get(path)
+  finally:
+    event.remove(db.get_engine(app), 'before_cursor_execute', before_cursor_execute)
+  assert response.status_code == 200, path
+  return len(statements)
+
+
+@pytest.mark.parametrize('path', sorted(PAGES))
+def test_statements_do_not_grow_with_rows(app, client, path):
+  with app.app_context():
+    seed(venues=2, artists=2)
+  small = count_statements(app, client, path)
+  with app.app_context():
+    seed(venues=8, artists=8)
+  large = count_statements(app, client, path)
+  assert small == large, path
+  assert large <= PAGES[path], path
+
+
+@pytest.mark.postgres
+def test_browse_genre_counts_are_cached(postgres_app):
+  # the page data cache is off by default, the genre counts of another
+  # genre selection still come from the per-process cache
+  facets_cache.entries.clear()
+  client = postgres_app.test_client()
+  with postgres_app.app_context():
+    seed()
+  first = count_statements(postgres_app, client, '/api/v1/venues/browse?genre=Jazz')
+  again = count_statements(postgres_app, client, '/api/v1/venues/browse?genre=Blues')
+  assert again == first - 1
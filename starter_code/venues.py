@@ -0,0 +1,279 @@
+from datetime import datetime
+
+from flask import (
+    Blueprint,
+    abort,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    url_for
+  )
+
+from forms import VenueForm
+from models import db, Venue, Artist, Show
+from queries import venue_areas, venue_areas_query, group_areas, show_page
+from loading import load
+from search import search
+from cache import cache
+from counters import counts
+from aio import reads
+from jobs import jobs
+from pages import (
+    request_now,
+    show_cursors,
+    page_validators,
+    conditional_response,
+    is_fresh,
+    touch,
+    columns,
+    venue_pages,
+    linked_ids,
+    linked_pages,
+    page_validators_async,
+    entity_data_async,
+    search_async
+  )
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+venues = Blueprint('venues', __name__, url_prefix='/venues')
+
+@venues.route('')
+def index():
+  # venues grouped by (city, state) with num_upcoming_shows aggregated
+  # in the database, no Show rows are loaded.
+  areas = cache.get_or_set('venues', '', lambda: list(venue_areas(request_now())))
+  return render_template('pages/venues.html', areas=areas)
+
+@venues.route('/search', methods=['POST'])
+def search_venues():
+  # case-insensitive partial match on the venue name, ranked
+  search_term = request.form.get('search_term', '')
+  page = max(request.form.get('page', 1, type=int), 1)
+  if search_term:
+    response, count = search(Venue, search_term, page, current_app.config['SEARCH_PAGE_SIZE'])
+  else:
+    count = ''
+    response = ''
+    flash('Please insert a value to search for a venue')
+  return render_template(
+      'pages/search_venues.html',
+      count=count,
+      results=response,
+      search_term=search_term,
+      page=page,
+      page_size=current_app.config['SEARCH_PAGE_SIZE']
+    )
+
+@venues.route('/<int:venue_id>')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  upcoming_after, past_before = show_cursors()
+  etag, last_modified = page_validators(Venue, Show.venue_id, venue_id)
+  return conditional_response(etag, last_modified, lambda: render_template(
+      'pages/show_venue.html',
+      venue=cache.get_or_set(
+        'venue:%d' % venue_id, etag,
+        lambda: venue_data(venue_id, upcoming_after, past_before)
+      )
+    ))
+
+def venue_data(venue_id, upcoming_after, past_before):
+  venue = load(Venue).get_or_404(venue_id)
+  now = request_now()
+
+  upcoming_shows, upcoming_next = show_page(
+      Show.venue_id, venue_id, Artist, now, True,
+      upcoming_after, current_app.config['SHOWS_PAGE_SIZE']
+    )
+  past_shows, past_next = show_page(
+      Show.venue_id, venue_id, Artist, now, False,
+      past_before, current_app.config['SHOWS_PAGE_SIZE']
+    )
+  return venue_page(columns(venue), counts(venue, now), upcoming_shows, upcoming_next, past_shows, past_next)
+
+def venue_page(data, show_counts, upcoming_shows, upcoming_next, past_shows, past_next):
+  # the venue's columns with its show lists, as show_venue.html takes them
+  upcoming_count, past_count = show_counts
+  data['past_shows'] = [{
+    'artist_id': show.artist_id,
+    'artist_name': show.artist_name,
+    'artist_image_link': show.artist_image_link,
+    'start_time': show.start_time.strftime("%m/%d/%Y at %H:%M")
+  } for show in past_shows]
+  data['upcoming_shows'] = [{
+    'artist_id': show.artist_id,
+    'artist_name': show.artist_name,
+    'artist_image_link': show.artist_image_link,
+    'start_time': show.start_time.strftime("%m/%d/%Y at %H:%M")
+  } for show in upcoming_shows]
+  data['past_shows_count'] = past_count
+  data['upcoming_shows_count'] = upcoming_count
+  data['past_next'] = past_next
+  data['upcoming_next'] = upcoming_next
+  return data
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@venues.route('/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@venues.route('/create', methods=['POST'])
+def create_venue_submission():
+  #this is not secure but since we haven't done how to propaly
+  #manage secret keys in this course, I guess we will leave it
+  #till then so we can write meta={'csrf': True} or just leave
+  #it as it is session secure.
+  form = VenueForm(request.form, meta={'csrf': False})
+
+  if form.validate():
+    try:
+      venue = Venue(
+          name = form.name.data,
+          city = form.city.data,
+          state = form.state.data,
+          address = form.address.data,
+          phone = form.phone.data,
+          genres = form.genres.data,
+          image_link = form.image_link.data,
+          facebook_link = form.facebook_link.data,
+          website_link = form.website_link.data,
+          seeking_talent = form.seeking_talent.data,
+          seeking_description = form.seeking_description.data
+      )
+
+      db.session.add(venue)
+      db.session.commit()
+      cache.invalidate('venues')
+      flash('Venue, ' + form.name.data + ' was successfully listed!')
+    except ValueError:
+        current_app.logger.exception('Venue could not be created')
+        db.session.rollback()
+    finally:
+        db.session.close()
+  else:
+      message = []
+      for field, err in form.errors.items():
+          message.append(field + ' ' + '|'.join(err))
+      flash('Errors ' + str(message))
+  return render_template('pages/home.html')
+
+@venues.route('/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # TODO: Complete this endpoint for taking a venue_id, and using
+  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+  # Marked deleted, which hides it and its shows right away; the rows
+  # are removed after the response by purge.py, a batch of shows at a time.
+  error = False
+
+  venue = load(Venue).get_or_404(venue_id)
+  pages = venue_pages(venue_id) + linked_pages(Venue, linked_ids(Venue, venue_id))
+  try:
+    venue.deleted_at = datetime.now()
+    # the artists' pages lose the venue's shows, right away
+    touch(Artist, db.select(Show.artist_id).where(Show.venue_id == venue_id))
+    jobs.enqueue('purge', {'table': 'venue', 'id': venue_id}, key='purge:venue:%d' % venue_id)
+    db.session.commit()
+    cache.invalidate(*pages)
+  except:
+    error = True
+    current_app.logger.exception('Venue %d could not be deleted', venue_id)
+    db.session.rollback()
+  finally:
+    db.session.close()
+  if error:
+    abort(500)
+
+  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+  # clicking that button delete it from the db then redirect the user to the homepage
+  return '', 204
+
+#  Update
+#  ----------------------------------------------------------------
+
+@venues.route('/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  form = VenueForm()
+  venue = load(Venue).get(venue_id)
+  # TODO: populate form with values from venue with ID <venue_id>
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@venues.route('/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  # TODO: take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
+  # TODO: take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  venue = load(Venue).get(venue_id)
+
+  error = False
+  try:
+    venue.name = request.form['name']
+    venue.city = request.form['city']
+    venue.state = request.form['state']
+    venue.address = request.form['address']
+    venue.phone = request.form['phone']
+    venue.genres = request.form.getlist('genres')
+    venue.image_link = request.form['image_link']
+    venue.facebook_link = request.form['facebook_link']
+    venue.website_link = request.form['website_link']
+    venue.seeking_talent = request.form.get('seeking_talent', '')
+    if venue.seeking_talent == '':
+      venue.seeking_talent = False
+    else:
+      venue.seeking_talent = True
+    venue.seeking_description = request.form['seeking_description']
+    db.session.add(venue)
+    jobs.enqueue('linked_pages', {'table': 'venue', 'id': venue_id})
+    db.session.commit()
+    cache.invalidate(*venue_pages(venue_id))
+  except:
+    error = True
+    current_app.logger.exception('Venue %d could not be edited', venue_id)
+    db.session.rollback()
+  finally:
+    db.session.close()
+  if error:
+    flash('An error occurred. Venue details could not be edited.')
+  else:
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+#  Async reads
+#  ----------------------------------------------------------------
+
+async def index_async():
+  async def compute():
+    rows, = await reads.run(venue_areas_query(request_now()))
+    return list(group_areas(rows))
+  areas = await cache.get_or_set_async('venues', '', compute)
+  return render_template('pages/venues.html', areas=areas)
+
+async def search_venues_async():
+  return await search_async(Venue, 'pages/search_venues.html', 'Please insert a value to search for a venue')
+
+async def show_venue_async(venue_id):
+  upcoming_after, past_before = show_cursors()
+  etag, last_modified = await page_validators_async(Venue, Show.venue_id, venue_id)
+  venue = None
+  if not is_fresh(etag, last_modified):
+    venue = await cache.get_or_set_async(
+      'venue:%d' % venue_id, etag,
+      lambda: entity_data_async(Venue, Show.venue_id, Artist, venue_id, upcoming_after, past_before, venue_page)
+    )
+  return conditional_response(etag, last_modified, lambda: render_template(
+      'pages/show_venue.html', venue=venue
+    ))
+
+# endpoints served by the async views with ASYNC_READS on
+async_views = {
+  'venues.index': index_async,
+  'venues.search_venues': search_venues_async,
+  'venues.show_venue': show_venue_async,
+}
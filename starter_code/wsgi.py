@@ -0,0 +1,4 @@
+from app import create_app
+
+# gunicorn wsgi:app
+app = create_app(migrations=False)